@@ -0,0 +1,160 @@
+import json
+import sqlite3
+import time
+
+import metrics
+
+DAY = 24 * 60 * 60
+
+# Papers younger than YOUNG_PAPER_AGE are refreshed every REFRESH_YOUNG, older ones every REFRESH_OLD.
+# The intervals are a day short of a week/month so that a weekly run always picks them up
+YOUNG_PAPER_AGE = 90 * DAY
+REFRESH_YOUNG = 6 * DAY
+REFRESH_OLD = 27 * DAY
+
+# PMIDs per SQL query, below SQLite's limit of 999 parameters
+QUERY_CHUNK = 500
+
+
+class AltmetricCache:
+    """
+    On-disk (SQLite) cache of raw Altmetric records keyed by PMID.
+    Each entry keeps the raw JSON, Altmetric's last_updated, the paper's publication
+    date and when it was fetched/last used. PMIDs Altmetric does not know (404) are
+    kept too, without payload, so they are not asked again every week; their age is
+    counted from the first time they were not found. The cache holds at most
+    max_entries records; the least recently used ones are evicted first.
+    """
+
+    def __init__(self, path, max_entries=100000, clock=time.time):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._db = sqlite3.connect(path)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS records (
+                                pmid TEXT PRIMARY KEY,
+                                payload TEXT,
+                                last_updated INTEGER,
+                                published_on INTEGER,
+                                fetched_at REAL NOT NULL,
+                                accessed_at REAL NOT NULL)''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS records_accessed ON records (accessed_at)')
+
+    def is_fresh(self, published_on, fetched_at):
+        """
+        Age-aware refresh policy: young papers are refreshed weekly, older ones monthly
+        INPUT : published_on(int or None) - epoch seconds, fetched_at(float) - epoch seconds
+        OUTPUT : True if the cached record can be used without calling Altmetric
+        """
+        now = self._clock()
+        young = published_on is None or now - published_on < YOUNG_PAPER_AGE
+        return now - fetched_at < (REFRESH_YOUNG if young else REFRESH_OLD)
+
+    def stale_pmids(self, pmids):
+        """
+        Looks up only the given PMIDs (QUERY_CHUNK at a time), never the whole cache
+        INPUT : pmids - iterable of PMIDs
+        OUTPUT : set of the PMIDs (str) that are missing from the cache or due for a refresh
+        """
+        pmids = [str(pmid) for pmid in pmids]
+        fresh = set()
+        for start in range(0, len(pmids), QUERY_CHUNK):
+            chunk = pmids[start:start + QUERY_CHUNK]
+            rows = self._db.execute('SELECT pmid, published_on, fetched_at FROM records WHERE pmid IN '
+                                    f'({",".join("?" * len(chunk))})', chunk)
+            fresh.update(pmid for pmid, published_on, fetched_at in rows if self.is_fresh(published_on, fetched_at))
+        return {pmid for pmid in pmids if pmid not in fresh}
+
+    def get(self, pmid):
+        """
+        INPUT : pmid(str)
+        OUTPUT : cached Altmetric record (dict), or None if the PMID is not cached or is a cached miss
+        """
+        row = self._db.execute('SELECT payload FROM records WHERE pmid = ?', (str(pmid),)).fetchone()
+        if row is None:
+            return None
+        self._db.execute('UPDATE records SET accessed_at = ? WHERE pmid = ?', (self._clock(), str(pmid)))
+        return None if row[0] is None else json.loads(row[0])
+
+    def __contains__(self, pmid):
+        return self._db.execute('SELECT 1 FROM records WHERE pmid = ?', (str(pmid),)).fetchone() is not None
+
+    def put(self, record):
+        """
+        Stores an Altmetric record as returned by the API
+        INPUT : record(dict)
+        OUTPUT : None
+        """
+        now = self._clock()
+        self._db.execute('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)',
+                         (str(record['pmid']), json.dumps(record), record.get('last_updated'),
+                          record.get('published_on') or record.get('added_on'), now, now))
+
+    def put_missing(self, pmid):
+        """
+        Stores a PMID Altmetric has no record for; the first time it was missing stands for its age
+        INPUT : pmid(str)
+        OUTPUT : None
+        """
+        now = self._clock()
+        self._db.execute('''INSERT INTO records VALUES (?, NULL, NULL, ?, ?, ?)
+                            ON CONFLICT (pmid) DO UPDATE SET payload = NULL, last_updated = NULL,
+                                published_on = COALESCE(published_on, excluded.published_on),
+                                fetched_at = excluded.fetched_at, accessed_at = excluded.accessed_at''',
+                         (str(pmid), now, now, now))
+
+    def commit(self):
+        """
+        Writes pending changes and evicts the least recently used records above max_entries
+        """
+        self._db.execute('''DELETE FROM records WHERE pmid IN (
+                                SELECT pmid FROM records ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)''',
+                         (self.max_entries,))
+        self._db.commit()
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+
+def iter_cached(fetcher, cache, pmids, cache_only=False, chunk_size=1000):
+    """
+    Same as AltmetricFetcher.iter_fetch but only calls Altmetric for PMIDs the cache
+    cannot serve, cached misses included. If a refresh fails, the previously cached record is used instead.
+    PMIDs are handled chunk_size at a time, so the freshness lookups do not grow with the cache
+    INPUT :
+        fetcher - AltmetricFetcher
+        cache - AltmetricCache
+        pmids - list of PMIDs
+        cache_only(bool) - never call Altmetric, PMIDs missing from the cache are reported as 'not_cached'
+        chunk_size(int)
+    OUTPUT : generator of (pmid(str), outcome(str), record(dict or None)) in input order
+    """
+    for start in range(0, len(pmids), chunk_size):
+        chunk = [str(pmid) for pmid in pmids[start:start + chunk_size]]
+        stale = set() if cache_only else cache.stale_pmids(chunk)
+        fetched = fetcher.iter_fetch(pmid for pmid in chunk if pmid in stale)
+        for pmid in chunk:
+            if pmid not in stale:
+                record = cache.get(pmid)
+                if record is not None:
+                    outcome = 'cached'
+                else:
+                    outcome = 'not_found' if pmid in cache else 'not_cached'
+                metrics.count('altmetric_outcomes_total', outcome=outcome)
+                yield pmid, outcome, record
+                continue
+            pmid, outcome, record = next(fetched)
+            if record is not None:
+                cache.put(record)
+            elif outcome == 'not_found':
+                cache.put_missing(pmid)
+            elif outcome in ('rate_limited', 'unavailable'):
+                record = cache.get(pmid)
+                outcome = outcome if record is None else 'stale'
+            metrics.count('altmetric_outcomes_total', outcome=outcome)
+            yield pmid, outcome, record
+        fetched.close()
+        cache.commit()
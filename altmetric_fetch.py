@@ -0,0 +1,117 @@
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from ratelimit import RateLimiter
+
+ALTMETRIC_API_URL = 'https://api.altmetric.com/v1/'
+
+# 420 is Altmetric's "rate limited" answer; 502/503 are returned during maintenance windows
+RETRY_STATUS_CODES = (420, 429, 502, 503)
+
+OUTCOME_MESSAGES = {
+    'not_found': "PMID not found",
+    'unauthorized': "You aren't authorized for this call",
+    'rate_limited': "You are being rate limited",
+    'unavailable': "The API version you are using is currently down for maintenance.",
+    'error': "Invalid API function",
+    'not_cached': "PMID not in the Altmetric cache",
+}
+
+
+class AltmetricFetcher:
+    """
+    Fetches Altmetric records for many PMIDs with a bounded pool of worker threads.
+    Every request goes through a shared token bucket (`rate` calls per second) and
+    420/429/502/503 answers are retried with exponential backoff before giving up.
+    api_url can point to a local stub server to exercise the fetcher offline.
+    """
+
+    def __init__(self, api_url=ALTMETRIC_API_URL, api_key=None, workers=4, rate=1.0,
+                 max_retries=4, backoff=2.0, session=None, limiter=None, sleep=None):
+        self.api_url = api_url.rstrip('/') + '/'
+        self.api_key = api_key
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.limiter = limiter or RateLimiter(rate)
+        self._sleep = sleep or time.sleep
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    def fetch(self, pmid):
+        """
+        Retrieves the Altmetric record of one PMID, retrying when rate limited
+        INPUT : pmid(str)
+        OUTPUT : (outcome(str), record(dict or None)) - outcome is 'ok' or one of OUTCOME_MESSAGES
+        """
+        params = {'key': self.api_key} if self.api_key else {}
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                with metrics.timed('altmetric_request'):
+                    rsp = self.session.get(f'{self.api_url}pmid/{pmid}', params=params, timeout=30)
+            except requests.RequestException:
+                status_code = None
+                metrics.count('altmetric_responses_total', code='connection_error')
+            else:
+                status_code = rsp.status_code
+                metrics.count('altmetric_responses_total', code=status_code)
+                if status_code == 200:
+                    try:
+                        return 'ok', rsp.json()
+                    except ValueError:  # truncated or non-JSON body: only this PMID fails
+                        return 'error', None
+                if status_code == 404:
+                    return 'not_found', None
+                if status_code == 403:
+                    return 'unauthorized', None
+                if status_code not in RETRY_STATUS_CODES:
+                    return 'error', None
+            if attempt < self.max_retries:
+                retry_after = rsp.headers.get('Retry-After') if status_code else None
+                delay = float(retry_after) if retry_after and retry_after.isdigit() \
+                    else self.backoff * 2 ** attempt
+                metrics.count('altmetric_retries_total', code=status_code or 'connection_error')
+                self._sleep(delay)
+        return ('rate_limited' if status_code in (420, 429) else 'unavailable'), None
+
+    def iter_fetch(self, pmids):
+        """
+        Fetches every PMID concurrently, yielding results in input order
+        Only a few requests per worker are in flight at any time, so memory does
+        not grow with the number of PMIDs
+        INPUT : pmids - iterable of PMIDs
+        OUTPUT : generator of (pmid(str), outcome(str), record(dict or None))
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = collections.deque()
+            for pmid in map(str, pmids):
+                pending.append((pmid, pool.submit(self.fetch, pmid)))
+                if len(pending) >= self.workers * 4:
+                    done_pmid, future = pending.popleft()
+                    yield (done_pmid,) + future.result()
+            while pending:
+                done_pmid, future = pending.popleft()
+                yield (done_pmid,) + future.result()
+
+    def fetch_all(self, pmids):
+        """
+        INPUT : pmids - iterable of PMIDs
+        OUTPUT : records - list of Altmetric records found, in input order
+                 outcomes - dict {pmid: outcome} for every PMID requested
+        """
+        records, outcomes = [], {}
+        for pmid, outcome, record in self.iter_fetch(pmids):
+            outcomes[pmid] = outcome
+            if record is not None:
+                records.append(record)
+        return records, outcomes
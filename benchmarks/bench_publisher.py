@@ -0,0 +1,49 @@
+"""
+Compares the hashtag bot's handling of streamed statuses with the account id cached by the shared Publisher
+against the previous Listener.on_status, which called verify_credentials for every status to recognise the
+bot's own tweets, on the offline FakeBackend
+Run from the repository root: python benchmarks/bench_publisher.py [n_statuses] [latency_seconds]
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from publisher import FakeBackend, Publisher, RateBudget  # noqa: E402
+
+ACCOUNT_ID = 1
+
+
+def statuses(n_statuses):
+    # One status in ten is the bot's own tweet
+    return [SimpleNamespace(id=i, user=SimpleNamespace(id=ACCOUNT_ID if i % 10 == 0 else 1000 + i))
+            for i in range(n_statuses)]
+
+
+def verify_per_status(stream, latency):
+    backend = FakeBackend(account_id=ACCOUNT_ID, latency=latency)
+    for status in stream:
+        if status.user.id != backend.account_id():  # api.verify_credentials()._json['id']
+            backend.retweet(status.id)
+    return backend
+
+
+def cached_account_id(stream, latency):
+    backend = FakeBackend(account_id=ACCOUNT_ID, latency=latency)
+    publisher = Publisher(backend, RateBudget(limit=float('inf')))
+    for status in stream:
+        if not publisher.is_own(status):
+            publisher.retweet(status.id)
+    return backend
+
+
+if __name__ == '__main__':
+    n_statuses = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.005
+    stream = statuses(n_statuses)
+    for name, run in (('verify_per_status', verify_per_status), ('cached_account_id', cached_account_id)):
+        start = time.perf_counter()
+        backend = run(stream, latency)
+        seconds = time.perf_counter() - start
+        print(f'{name}: {n_statuses / seconds:.0f} statuses/s, {len(backend.calls)} calls for {n_statuses} statuses')
@@ -0,0 +1,82 @@
+"""
+Measures the throughput of the local TitleMatcher compiled from the geriatrics search strategy,
+against a baseline of one compiled alternation regex per term list
+Run from the repository root: python benchmarks/bench_query.py [n_titles]
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pubmed import (EXCLUDED_TERMS, GERIATRIC_POPULATION_TERMS, GERIATRIC_QUERY,  # noqa: E402
+                    REVIEW_DESIGN_TERMS)
+from query_builder import PUBLICATION_TYPE_FIELDS, compile_matcher, parse, title_words  # noqa: E402
+
+WORDS = ['outcomes', 'of', 'hip', 'fracture', 'surgery', 'in', 'patients', 'with', 'frailty', 'a', 'cohort',
+         'study', 'randomized', 'trial', 'care', 'home', 'residents', 'cognitive', 'decline', 'and', 'risk',
+         'falls', 'among', 'community-dwelling', 'adults', 'hospital', 'mortality', 'after', 'stroke']
+QUERY_WORDS = ['older', 'elderly', 'dementia', 'delirium', 'aging', 'mice', 'rats', 'octogenarians',
+               "Parkinson's", 'systematic review', 'meta analysis', 'zebrafish', '65 years']
+
+
+def synthetic_titles(n_titles, seed=0):
+    rng = random.Random(seed)
+    titles = []
+    for _ in range(n_titles):
+        words = rng.choices(WORDS, k=rng.randint(6, 18)) + rng.sample(QUERY_WORDS, rng.randint(0, 3))
+        rng.shuffle(words)
+        titles.append(' '.join(words).capitalize())
+    return titles
+
+
+def alternation_regex(terms):
+    """
+    One case-insensitive regex matching any of the title terms ([pt] terms are left out, as titles
+    alone never match them in the TitleMatcher either)
+    """
+    patterns = []
+    for term in map(parse, terms):
+        if (term.field or '').lower() in PUBLICATION_TYPE_FIELDS:
+            continue
+        words = [re.escape(word) for word in title_words(term.text)]
+        ending = r'\w*' if term.text.endswith('*') else r"(?![\w'])"
+        patterns.append(r"(?<![\w'])" + r"[^\w']+".join(words) + ending)
+    return re.compile('|'.join(patterns), re.IGNORECASE)
+
+
+def regex_matcher(population, exclude, designs):
+    """
+    Baseline: the ((population) NOT (exclude)) OR ((population) AND (designs)) logic of build_query
+    evaluated with three alternation regexes
+    """
+    population, exclude, designs = map(alternation_regex, (population, exclude, designs))
+    return lambda title: bool(population.search(title) and (not exclude.search(title) or designs.search(title)))
+
+
+def throughput(matcher, titles):
+    """
+    OUTPUT : (titles per second, number of matching titles)
+    """
+    start = time.perf_counter()
+    matches = sum(1 for title in titles if matcher(title))
+    return len(titles) / (time.perf_counter() - start), matches
+
+
+if __name__ == '__main__':
+    n_titles = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    titles = synthetic_titles(n_titles)
+
+    start = time.perf_counter()
+    matcher = compile_matcher(GERIATRIC_QUERY)
+    compile_seconds = time.perf_counter() - start
+    baseline = regex_matcher(GERIATRIC_POPULATION_TERMS, EXCLUDED_TERMS, REVIEW_DESIGN_TERMS)
+
+    titles_per_second, matches = throughput(matcher, titles)
+    baseline_per_second, baseline_matches = throughput(baseline, titles)
+    disagreements = sum(1 for title in titles if matcher(title) != baseline(title))
+    print(f'compile: {compile_seconds * 1000:.2f} ms')
+    print(f'TitleMatcher: {titles_per_second:,.0f} titles/s ({n_titles} titles, {matches} matches)')
+    print(f'regex baseline: {baseline_per_second:,.0f} titles/s ({n_titles} titles, {baseline_matches} matches)')
+    print(f'titles the two disagree on: {disagreements}')
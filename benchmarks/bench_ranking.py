@@ -0,0 +1,55 @@
+"""
+Benchmarks ranking.top_altmetric_papers against the selection highest_altemtric_score used before
+(isin mask + score.max() + boolean mask) on a synthetic Altmetric frame
+Run from the repository root: python benchmarks/bench_ranking.py [n_rows]
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from ranking import top_altmetric_papers  # noqa: E402
+
+
+def synthetic_frame(n_rows, seed=0):
+    """
+    INPUT : n_rows(int), seed(int)
+    OUTPUT : pd.df shaped like altmetric_search output (pmid as str, rounded scores so ties happen)
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'pmid': rng.choice(np.arange(30000000, 40000000), n_rows, replace=False).astype(str),
+        'score': np.round(rng.pareto(1.5, n_rows) * 5, 1),
+        'context.journal.pct': rng.integers(0, 100, n_rows).astype(float),
+        'cited_by_tweeters_count': rng.integers(0, 500, n_rows),
+    })
+
+
+def legacy_selection(altmetric_df, excluded):
+    new_pd = altmetric_df[~altmetric_df['pmid'].isin(excluded)]
+    max_row = new_pd[new_pd.score == new_pd.score.max()]
+    return max_row.iloc[[0]]
+
+
+if __name__ == '__main__':
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    altmetric_df = synthetic_frame(n_rows)
+    excluded = altmetric_df.nlargest(52, 'score')['pmid'].tolist()  # one year of weekly winners
+
+    legacy = legacy_selection(altmetric_df, excluded)
+    top = top_altmetric_papers(altmetric_df, k=1, exclude=excluded)
+    assert legacy['pmid'].tolist() == top['pmid'].tolist(), 'selection differs from the legacy implementation'
+
+    runs = 20
+    timings = {
+        'legacy_k1': timeit.timeit(lambda: legacy_selection(altmetric_df, excluded), number=runs),
+        'top_k1': timeit.timeit(lambda: top_altmetric_papers(altmetric_df, 1, excluded), number=runs),
+        'top_k10': timeit.timeit(lambda: top_altmetric_papers(altmetric_df, 10, excluded), number=runs),
+        'top_k10_journal': timeit.timeit(
+            lambda: top_altmetric_papers(altmetric_df, 10, excluded, normalize='journal'), number=runs),
+    }
+    for name, seconds in timings.items():
+        print(f'{name}: {seconds / runs * 1000:.2f} ms ({n_rows} rows)')
@@ -0,0 +1,448 @@
+"""
+Offline benchmark harness for the three bots: drives pubmed_search, discover_articles + post_article,
+altmetric_search (and its streaming version), highest_altemtric_score and Listener.on_status against synthetic (or recorded)
+fixtures served by a local stub server, with a virtual clock in place of time.sleep, so no credential
+or network is needed and rate limits cost no real time.
+One JSON line per scenario and scale: wall time, virtual (slept) time, request count and peak memory.
+Run from the repository root:
+    python benchmarks/harness.py [--scales 1000 10000 ...] [--scenarios pubmed_search ...]
+                                 [--stream recorded.jsonl] [--output results.jsonl]
+"""
+import argparse
+import contextlib
+import http.server
+import io
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import urllib.request
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import config  # noqa: E402
+
+NCBI_URL = 'https://eutils.ncbi.nlm.nih.gov'
+FIRST_PMID = 30000000
+OWN_ACCOUNT_ID = 1  # FakeBackend's account id
+
+
+class VirtualClock:
+    """
+    Stands in for the time module in ratelimit, altmetric_fetch and Bio.Entrez:
+    sleep() advances the clock instead of blocking, so the harness measures the work and
+    reports separately how long the rate limits would have made the bots wait
+    """
+
+    def __init__(self):
+        self._now = 0.0
+        self._lock = threading.Lock()
+        self.slept = 0.0
+
+    def monotonic(self):
+        with self._lock:
+            return self._now
+
+    time = monotonic
+
+    def sleep(self, seconds):
+        with self._lock:
+            if seconds > 0:
+                self._now += seconds
+                self.slept += seconds
+
+
+class Fixtures:
+    """
+    Deterministic synthetic PubMed and Altmetric records: the same PMID always gets the same record
+    """
+
+    def __init__(self, n_articles, rate_limited_every=100):
+        self.n_articles = n_articles
+        self.rate_limited_every = rate_limited_every
+        self._rate_limited = set()
+        self._lock = threading.Lock()
+
+    def pmids(self, retstart=0, retmax=None):
+        stop = self.n_articles if retmax is None else min(self.n_articles, retstart + retmax)
+        return [str(FIRST_PMID + i) for i in range(retstart, stop)]
+
+    @staticmethod
+    def title(pmid):
+        rng = random.Random(pmid)
+        words = ['frailty', 'older adults', 'delirium', 'falls', 'sarcopenia', 'dementia', 'polypharmacy',
+                 'nursing home', 'hip fracture', 'cohort', 'randomized trial', 'systematic review']
+        return f'{rng.choice(words).capitalize()} and {rng.choice(words)} in {rng.choice(words)}'
+
+    def altmetric_record(self, pmid):
+        rng = random.Random(pmid)
+        return {
+            'pmid': pmid,
+            'title': self.title(pmid),
+            'score': round(rng.paretovariate(1.5) * 5, 1),
+            'cited_by_tweeters_count': rng.randrange(500),
+            'published_on': int(time.time()) - rng.randrange(5 * 365) * 86400,
+            'last_updated': int(time.time()),
+            'context': {'journal': {'pct': rng.randrange(100)}, 'similar_age_3m': {'pct': rng.randrange(100)},
+                        'similar_age_journal_3m': {'pct': rng.randrange(100)}},
+            'details_url': f'https://www.altmetric.com/details.php?citation_id={pmid}',
+        }
+
+    def first_call_rate_limited(self, pmid):
+        """
+        Every rate_limited_every-th PMID is answered 420 the first time, to exercise the retries
+        """
+        if int(pmid) % self.rate_limited_every:
+            return False
+        with self._lock:
+            if pmid in self._rate_limited:
+                return False
+            self._rate_limited.add(pmid)
+            return True
+
+    def esearch_xml(self, retstart, retmax):
+        ids = ''.join(f'<Id>{pmid}</Id>' for pmid in self.pmids(retstart, retmax))
+        return ('<?xml version="1.0" encoding="UTF-8" ?>\n'
+                '<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN" '
+                '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">\n'
+                f'<eSearchResult><Count>{self.n_articles}</Count><RetMax>{retmax}</RetMax>'
+                f'<RetStart>{retstart}</RetStart><QueryKey>1</QueryKey><WebEnv>HARNESS</WebEnv>'
+                f'<IdList>{ids}</IdList></eSearchResult>')
+
+    def esummary_xml(self, pmids):
+        docsums = []
+        for pmid in pmids:
+            docsums.append(
+                f'<DocSum><Id>{pmid}</Id>'
+                '<Item Name="PubDate" Type="Date">2026 Oct 1</Item>'
+                '<Item Name="Source" Type="String">J Am Geriatr Soc</Item>'
+                '<Item Name="AuthorList" Type="List"><Item Name="Author" Type="String">Doe J</Item>'
+                '<Item Name="Author" Type="String">Roe R</Item></Item>'
+                f'<Item Name="Title" Type="String">{self.title(pmid)}.</Item>'
+                '<Item Name="PubTypeList" Type="List"><Item Name="PubType" Type="String">Journal Article</Item></Item>'
+                '<Item Name="FullJournalName" Type="String">Journal of the American Geriatrics Society</Item>'
+                '</DocSum>')
+        return ('<?xml version="1.0" encoding="UTF-8" ?>\n'
+                '<!DOCTYPE eSummaryResult PUBLIC "-//NLM//DTD esummary v1 20041029//EN" '
+                '"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20041029/esummary-v1.dtd">\n'
+                f'<eSummaryResult>{"".join(docsums)}</eSummaryResult>')
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Local stand-in for the Entrez E-utilities (/entrez/eutils/esearch.fcgi, esummary.fcgi)
+    and the Altmetric API (/v1/pmid/<pmid>)
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        self.answer(url.path, urllib.parse.parse_qs(url.query))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        url = urllib.parse.urlsplit(self.path)
+        self.answer(url.path, urllib.parse.parse_qs(body))
+
+    def answer(self, path, params):
+        server = self.server
+        fixtures = server.fixtures
+        server.count(path.rsplit('/', 2)[-2] if path.startswith('/v1/') else path.rsplit('/', 1)[-1])
+        if path.endswith('/esearch.fcgi'):
+            retstart = int(params.get('retstart', ['0'])[0])
+            retmax = int(params.get('retmax', ['20'])[0])
+            self.send(200, fixtures.esearch_xml(retstart, retmax), 'text/xml')
+        elif path.endswith('/esummary.fcgi'):
+            if 'id' in params:
+                pmids = params['id'][0].split(',')
+            else:
+                retstart = int(params.get('retstart', ['0'])[0])
+                pmids = fixtures.pmids(retstart, int(params.get('retmax', ['20'])[0]))
+            self.send(200, fixtures.esummary_xml(pmids), 'text/xml')
+        elif path.startswith('/v1/pmid/'):
+            pmid = path.rsplit('/', 1)[-1]
+            if fixtures.first_call_rate_limited(pmid):
+                self.send(420, 'Rate limited', 'text/plain')
+            else:
+                self.send(200, json.dumps(fixtures.altmetric_record(pmid)), 'application/json')
+        else:
+            self.send(404, 'Not Found', 'text/plain')
+
+    def send(self, status, body, content_type):
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fixtures):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.fixtures = fixtures
+        self.requests = {}
+        self._lock = threading.Lock()
+        self.url = f'http://127.0.0.1:{self.server_address[1]}'
+
+    def count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+@contextlib.contextmanager
+def offline_bots(workdir, fixtures):
+    """
+    Points every bot at the stub server and the virtual clock, with all their files in workdir
+    OUTPUT : (StubServer, VirtualClock)
+    """
+    import altmetric_fetch
+    import pmid_store
+    import pubmed
+    import ratelimit
+    import summary_store
+    from Bio import Entrez
+
+    clock = VirtualClock()
+    with StubServer(fixtures) as server, contextlib.ExitStack() as patches:
+        def stub_urlopen(request, *args, **kwargs):
+            request.full_url = request.full_url.replace(NCBI_URL, server.url)
+            return urllib.request.urlopen(request, *args, **kwargs)
+
+        patches.enter_context(mock.patch.object(Entrez, 'urlopen', stub_urlopen))
+        for module in (Entrez, ratelimit, altmetric_fetch):
+            patches.enter_context(mock.patch.object(module, 'time', clock))
+        patches.enter_context(mock.patch.object(pubmed, '_entrez_limiter', None))
+        patches.enter_context(mock.patch.dict(pmid_store._stores, clear=True))
+        patches.enter_context(mock.patch.dict(summary_store._stores, clear=True))
+        for name, value in (('altmetric_api_url', server.url + '/v1/'),
+                            ('altmetric_cache_path', os.path.join(workdir, 'altmetric_cache.sqlite')),
+                            ('pubmed_summaries_path', os.path.join(workdir, 'pubmed_summaries.sqlite')),
+                            ('pubmed_email', 'harness@example.org'),
+                            ('altmetric_rate', 1)):
+            patches.enter_context(mock.patch.object(config, name, value))
+        previous_directory = os.getcwd()
+        os.chdir(workdir)
+        try:
+            yield server, clock
+        finally:
+            os.chdir(previous_directory)
+
+
+SCENARIOS = {}
+
+
+def scenario(function):
+    SCENARIOS[function.__name__] = function
+    return function
+
+
+@scenario
+def pubmed_search(scale, workdir, options):
+    """
+    One esearch on the history server and scale/200 esummary batches
+    """
+    import pubmed
+
+    with offline_bots(workdir, Fixtures(scale)) as (server, clock):
+        with measure() as result:
+            articles = pubmed.pubmed_search(pubmed.GERIATRIC_QUERY, scale)
+        assert len(articles) == scale, f'{len(articles)} articles for {scale} PMIDs'
+        return dict(result, requests=sum(server.requests.values()), virtual_seconds=clock.slept)
+
+
+@scenario
+def discover_and_post(scale, workdir, options):
+    """
+    The deduplication path of the PubMed bot: a 300-article sweep (half of it already tweeted) checked
+    by discover_articles against a pmid_db.txt of scale PMIDs, then the 150 new articles posted through
+    post_article and the fake Twitter backend
+    """
+    import pubmed
+    from publish_queue import PublishQueue, run_publisher
+    from publisher import FakeBackend, Publisher, RateBudget
+
+    pmid_db = os.path.join(workdir, 'pmid_db.txt')
+    with open(pmid_db, 'w') as db_file:
+        db_file.write(''.join(f'{FIRST_PMID + 150 + i}\n' for i in range(max(scale, 150))))
+    backend = FakeBackend(account_id=OWN_ACCOUNT_ID)
+    publisher = Publisher(backend, RateBudget(limit=float('inf')))
+    with offline_bots(workdir, Fixtures(300)) as (server, clock), \
+            mock.patch.object(pubmed, 'get_publisher', lambda: publisher):
+        publish_queue = PublishQueue(os.path.join(workdir, 'publish_queue.sqlite'))
+        with measure() as result:
+            queued = pubmed.discover_articles(pubmed.GERIATRIC_QUERY, 300, pmid_db, publish_queue)
+            run_publisher(publish_queue, lambda pmid, text: pubmed.post_article(pmid, text, pmid_db), 0)
+        publish_queue.close()
+        assert queued == 150, f'{queued} articles queued'
+        posted = sum(call[0] == 'update_status' for call in backend.calls)
+        assert posted == 150, f'{posted} articles posted'
+        return dict(result, requests=sum(server.requests.values()) + len(backend.calls),
+                    virtual_seconds=clock.slept)
+
+
+@scenario
+def altmetric_search(scale, workdir, options):
+    """
+    Weekly Altmetric run over scale PMIDs with an empty cache (every PMID fetched, 1% rate limited once)
+    """
+    import geripapers_altmetric
+
+    fixtures = Fixtures(scale)
+    with offline_bots(workdir, fixtures) as (server, clock):
+        with measure() as result, contextlib.redirect_stdout(io.StringIO()):
+            altmetric_df = geripapers_altmetric.altmetric_search(fixtures.pmids())
+        assert len(altmetric_df) == scale, f'{len(altmetric_df)} records for {scale} PMIDs'
+        return dict(result, requests=sum(server.requests.values()), virtual_seconds=clock.slept)
+
+
+@scenario
+def altmetric_search_streaming(scale, workdir, options):
+    """
+    Bounded-memory weekly Altmetric run over scale PMIDs: first with an empty cache (every PMID fetched),
+    then again with every record cached, as on most Sundays. Peak memory should not grow with scale
+    """
+    import pandas  # noqa: F401 - imported lazily by the bot, kept out of the measured peak
+
+    import geripapers_altmetric
+
+    fixtures = Fixtures(scale)
+    pmids = fixtures.pmids()
+    with offline_bots(workdir, fixtures) as (server, clock):
+        with measure() as result:
+            top = geripapers_altmetric.altmetric_search_streaming(pmids)
+        with measure() as cached:
+            cached_top = geripapers_altmetric.altmetric_search_streaming(pmids)
+        assert list(top['pmid']) == list(cached_top['pmid'])
+        return dict(result, requests=sum(server.requests.values()), virtual_seconds=clock.slept,
+                    cached_wall_seconds=cached['wall_seconds'], cached_peak_memory_bytes=cached['peak_memory_bytes'])
+
+
+@scenario
+def highest_altemtric_score(scale, workdir, options):
+    """
+    Selection of the weekly paper among scale Altmetric records, a year of winners already in the CSV
+    """
+    import pandas as pd
+
+    import geripapers_altmetric
+
+    fixtures = Fixtures(scale)
+    altmetric_df = pd.json_normalize([fixtures.altmetric_record(pmid) for pmid in fixtures.pmids()])
+    altmetric_df.insert(0, 'analysis_date', time.strftime('%d_%m_%Y'))
+    with offline_bots(workdir, fixtures):
+        altmetric_df.nlargest(52, 'score').to_csv('highest_altmetric_papers.csv', index=False)
+        with measure() as result:
+            geripapers_altmetric.highest_altemtric_score(altmetric_df)
+        return dict(result, requests=0, virtual_seconds=0.0)
+
+
+def synthetic_statuses(n_statuses):
+    """
+    Stream payloads as sent by the Twitter streaming API: 10% retweets, 5% quotes,
+    5% tweets from the bot itself and 5% statuses delivered twice
+    """
+    rng = random.Random(0)
+    for i in range(n_statuses):
+        status_id = 1500000000000000000 + (i - 1 if i and rng.random() < 0.05 else i)
+        user_id = OWN_ACCOUNT_ID if rng.random() < 0.05 else 1000 + rng.randrange(5000)
+        payload = {'id': status_id, 'id_str': str(status_id), 'text': f'New #geripapers paper {i}',
+                   'user': {'id': user_id, 'id_str': str(user_id), 'screen_name': f'user{user_id}'}}
+        kind = rng.random()
+        if kind < 0.10:
+            payload['retweeted_status'] = {'id': status_id - 1, 'text': 'original'}
+        elif kind < 0.15:
+            payload['quoted_status'] = {'id': status_id - 1, 'text': 'quoted'}
+        yield payload
+
+
+@scenario
+def listener(scale, workdir, options):
+    """
+    Listener.on_status fed a stream of scale statuses (options.stream replays a recorded .jsonl instead),
+    retweeting through the fake Twitter backend
+    """
+    import tweepy
+
+    from hashtag_reteweet import Listener, RetweetPipeline
+    from publisher import FakeBackend, Publisher, RateBudget
+
+    if options.stream:
+        with open(options.stream) as recorded:
+            payloads = [json.loads(line) for line in recorded if line.strip()]
+    else:
+        payloads = list(synthetic_statuses(scale))
+    statuses = [tweepy.models.Status.parse(None, payload) for payload in payloads]
+    backend = FakeBackend(account_id=OWN_ACCOUNT_ID)
+    pipeline = RetweetPipeline(Publisher(backend, RateBudget(limit=float('inf'))), max_queue=len(statuses))
+    stream = Listener('key', 'secret', 'token', 'token_secret', pipeline=pipeline.start())
+    with measure() as result, contextlib.redirect_stdout(io.StringIO()):
+        for status in statuses:
+            stream.on_status(status)
+        pipeline.stop()
+    stats = pipeline.stats()
+    return dict(result, requests=len(backend.calls), virtual_seconds=0.0, statuses=len(statuses),
+                retweeted=stats.get('retweeted', 0), latency_p95=stats.get('latency_p95'))
+
+
+@contextlib.contextmanager
+def measure():
+    """
+    Yields a dict filled, once the block is done, with its wall time and the peak of memory
+    allocated by Python during the block (tracemalloc)
+    """
+    result = {}
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['wall_seconds'] = time.perf_counter() - start
+        result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+
+def run(scenario_names, scales, options):
+    """
+    OUTPUT : yields one result (dict) per scenario and scale
+    """
+    for name in scenario_names:
+        for scale in scales:
+            with tempfile.TemporaryDirectory() as workdir:
+                result = SCENARIOS[name](scale, workdir, options)
+            yield dict(scenario=name, scale=scale, **result,
+                       max_rss_bytes=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000])
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--stream', help='recorded stream (.jsonl) for the listener scenario')
+    parser.add_argument('--output', help='also append the results to this .jsonl file')
+    options = parser.parse_args()
+
+    for result in run(options.scenarios, options.scales, options):
+        line = json.dumps(result)
+        print(line, flush=True)
+        if options.output:
+            with open(options.output, 'a') as output_file:
+                output_file.write(line + '\n')
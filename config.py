@@ -7,3 +7,23 @@ pubmed_email = '' #insert email used to create a PubMed account
 pubmed_api_key = '' #insert pubmed api key
 pythonanywhere_username = '' #insert PythonAnywhere username
 pythonanywhere_token = '' #insert PythonAnywhere token
+altmetric_api_key = '' #insert Altmetric api key (optional)
+altmetric_api_url = 'https://api.altmetric.com/v1/' #Altmetric API (benchmarks/harness.py points it to a local stub)
+altmetric_workers = 4 #number of concurrent Altmetric requests
+altmetric_rate = 1 #Altmetric requests per second
+altmetric_cache_path = 'altmetric_cache.sqlite' #on-disk cache of Altmetric records
+altmetric_cache_max_entries = 100000 #least recently used records above this are evicted
+altmetric_snapshot_dir = 'altmetric_snapshots' #weekly Parquet snapshots of every Altmetric record
+publish_queue_path = 'publish_queue.sqlite' #articles found by pubmed.py waiting to be tweeted
+publish_interval = 1200 #seconds between two PubMed tweets (1200 seconds equals 20 minutes)
+pubmed_state_path = 'pubmed_state.json' #date of the last successful PubMed sweep (set to None to search the 300 latest articles instead)
+pubmed_summaries_path = 'pubmed_summaries.sqlite' #PubMed summaries of every article found by pubmed.py
+altmetric_streaming = False #True keeps memory flat on small workers (no Parquet snapshot, see altmetric_spill_dir)
+altmetric_spill_dir = None #directory for the full Altmetric records in streaming mode (None to discard them)
+metrics_dir = 'metrics' #<bot>.prom (Prometheus text format) and <bot>.jsonl (stages and messages) of each bot, None to disable
+profile_sample_rate = 0 #fraction of runs profiled with cProfile (e.g. 0.1), 0 to disable
+profile_dir = 'profiles' #cProfile files (<bot>_<date>.prof, open with python -m pstats)
+service_state_path = 'service_state.json' #last run of each job scheduled by geripapers_service.py
+service_sweep_interval = 24 * 60 * 60 #seconds between two PubMed sweeps in geripapers_service.py
+service_weekly_hour = 12 #hour of the weekly Altmetric thread on Sundays in geripapers_service.py
+service_stream = True #False to run the hashtag stream separately (hashtag_reteweet.py)
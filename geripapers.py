@@ -0,0 +1,225 @@
+"""
+Command line entry point for the bots. Each subcommand imports only what it needs when it runs,
+so cheap commands (and the weekly thread on the six days it has nothing to do) start fast.
+    python geripapers.py search [--full] [--publish]     PubMed sweep, new articles added to the publish queue
+    python geripapers.py rank [-k 5] [--cache-only]      preview of the best unselected papers by Altmetric score
+    python geripapers.py thread [--force] [--cache-only] weekly Altmetric thread (Sundays only unless --force)
+    python geripapers.py stream [--replay statuses.jsonl] hashtag stream (or replay of a recorded one)
+    python geripapers.py dedup-stats                     PMID database, publish queue and cache counts
+    python geripapers.py service                         every bot in one process (geripapers_service.py)
+    python geripapers.py startup [command ...]           start-up time and memory of each subcommand
+With --dry-run (before the subcommand), a subcommand imports what it needs and exits without running.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+import config
+
+PMID_DB = 'pmid_db.txt'
+
+# Command lines measured by the startup subcommand when none is given; the weekly thread is measured
+# as it runs today (on a weekday it imports nothing) and as it runs on Sundays
+STARTUP_COMMANDS = ['search', 'rank', 'thread', 'thread --force', 'stream', 'dedup-stats', 'service']
+
+
+def search(args):
+    import metrics
+    from publish_queue import PublishQueue, run_publisher
+    from pubmed import GERIATRIC_QUERY, discover_articles, post_article
+
+    if args.dry_run:
+        return
+    with metrics.run('pubmed'):
+        publish_queue = PublishQueue(config.publish_queue_path)
+        queued = discover_articles(GERIATRIC_QUERY, args.max, PMID_DB, publish_queue,
+                                   state_file=None if args.full else config.pubmed_state_path)
+        print(f'{queued} new articles queued')
+        if args.publish:
+            run_publisher(publish_queue, lambda pmid, text: post_article(pmid, text, PMID_DB),
+                          config.publish_interval)
+
+
+def rank(args):
+    import metrics
+    from geripapers_altmetric import altmetric_search, already_selected_pmids
+    from pmid_store import open_store
+    from ranking import top_altmetric_papers
+
+    if args.dry_run:
+        return
+    with metrics.run('altmetric'):
+        altmetric_df = altmetric_search(open_store(PMID_DB).pmids(), cache_only=args.cache_only)
+        top = top_altmetric_papers(altmetric_df, k=args.k, exclude=already_selected_pmids())
+    for _, row in top.iterrows():
+        print(f"{row['pmid']}  {row['score']:>8}  {row['title']}")
+
+
+def thread(args):
+    if datetime.date.today().weekday() != 6 and not args.force:
+        print('It is not Sunday')
+        return
+
+    import metrics
+    from geripapers_altmetric import weekly_thread
+
+    if args.dry_run:
+        return
+    with metrics.run('altmetric'):
+        weekly_thread(cache_only=args.cache_only)
+
+
+def stream(args):
+    import metrics
+    from hashtag_reteweet import KEYWORDS, Listener, RetweetPipeline, replay_stream
+    from publisher import FakeBackend, Publisher, RateBudget
+
+    if args.dry_run:
+        return
+    if args.replay:
+        # Offline run: replays a recorded stream against the fake Twitter backend
+        publisher = Publisher(FakeBackend(), RateBudget(limit=float('inf')))
+        print(replay_stream(args.replay, RetweetPipeline(publisher).start()))
+        return
+    with metrics.run('hashtag'):
+        Listener(config.api_key, config.api_key_secret, config.access_token,
+                 config.access_token_secret).filter(track=KEYWORDS)
+
+
+def dedup_stats(args):
+    from altmetric_cache import AltmetricCache
+    from pmid_store import open_store
+    from publish_queue import PublishQueue
+    from summary_store import open_summary_store
+
+    if args.dry_run:
+        return
+    stats = {}
+    if os.path.exists(PMID_DB):
+        with open(PMID_DB, 'rb') as db:
+            data = db.read()
+        lines = [line for line in data.split(b'\n')[:-1] if line.strip()]
+        store = open_store(PMID_DB)
+        stats['pmid_db'] = {'lines': len(lines), 'pmids': len(store), 'duplicate_lines': len(lines) - len(store),
+                            'torn_last_line': not data.endswith(b'\n') and bool(data)}
+    if os.path.exists(config.publish_queue_path):
+        publish_queue = PublishQueue(config.publish_queue_path)
+        stats['publish_queue'] = publish_queue.counts()
+        publish_queue.close()
+    if os.path.exists(config.pubmed_summaries_path):
+        stats['pubmed_summaries'] = len(open_summary_store(config.pubmed_summaries_path))
+    if os.path.exists(config.altmetric_cache_path):
+        cache = AltmetricCache(config.altmetric_cache_path)
+        stats['altmetric_cache'] = len(cache)
+        cache.close()
+    print(json.dumps(stats, indent=2))
+
+
+def service(args):
+    import asyncio
+
+    import metrics
+    from geripapers_service import main
+
+    if args.dry_run:
+        asyncio.run(main(dry_run=True))
+        return
+    with metrics.run('service'):
+        asyncio.run(main())
+
+
+def parse_importtime(stderr):
+    """
+    INPUT : stderr(str) of python -X importtime
+    OUTPUT : list of (module(str), cumulative microseconds(int)) imported at the top level
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name[1:].startswith(' '):  # nested imports are indented
+            modules.append((name.strip(), int(cumulative)))
+    return modules
+
+
+def startup_report(command):
+    """
+    Runs one subcommand with --dry-run in a fresh interpreter with -X importtime: the real entry point,
+    stopped where the subcommand would start its work (modules the work imports later, such as Biopython
+    on the first PubMed request, are not counted)
+    INPUT : command(str) - subcommand and its arguments, e.g. 'thread --force'
+    OUTPUT : dict with the run time of the process, the time spent in imports, the slowest
+             top-level imports and the peak memory (RSS) of the process
+    """
+    import subprocess
+
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', os.path.abspath(__file__), '--dry-run',
+                                *command.split()], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    stderr = process.stderr.read()
+    _, status, usage = os.wait4(process.pid, 0)  # resource usage of this process alone
+    total = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    process.stderr.close()
+    if process.returncode:
+        errors = [line for line in stderr.splitlines() if not line.startswith('import time:')]
+        sys.exit(f'{command}: {errors[-1] if errors else f"exit status {process.returncode}"}')
+    imports = parse_importtime(stderr)
+    slowest = sorted(imports, key=lambda module: -module[1])[:5]
+    return {'command': command, 'total_ms': round(total * 1000, 1),
+            'import_ms': round(sum(cumulative for _, cumulative in imports) / 1000, 1),
+            'max_rss_mb': round(usage.ru_maxrss / 1024, 1),
+            'slowest_imports_ms': {name: round(cumulative / 1000, 1) for name, cumulative in slowest}}
+
+
+def startup(args):
+    for command in args.commands or STARTUP_COMMANDS:
+        print(json.dumps(startup_report(command)), flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='geripapers', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='import what the command needs, then exit')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('search', help='search PubMed and queue the new articles')
+    command.add_argument('--full', action='store_true', help='search the latest --max articles, not only new ones')
+    command.add_argument('--max', type=int, default=300, help='number of articles searched with --full')
+    command.add_argument('--publish', action='store_true', help='then tweet the queued articles')
+    command.set_defaults(handler=search)
+
+    command = commands.add_parser('rank', help='preview the best unselected papers by Altmetric score')
+    command.add_argument('-k', type=int, default=5)
+    command.add_argument('--cache-only', action='store_true', help='rank from the Altmetric cache only')
+    command.set_defaults(handler=rank)
+
+    command = commands.add_parser('thread', help='post the weekly Altmetric thread (Sundays)')
+    command.add_argument('--force', action='store_true', help='post it even if it is not Sunday')
+    command.add_argument('--cache-only', action='store_true', help='rank from the Altmetric cache only')
+    command.set_defaults(handler=thread)
+
+    command = commands.add_parser('stream', help='retweet the #geripapers hashtags')
+    command.add_argument('--replay', help='replay a recorded stream (.jsonl) against a fake Twitter backend')
+    command.set_defaults(handler=stream)
+
+    command = commands.add_parser('dedup-stats', help='PMID database, publish queue and cache counts')
+    command.set_defaults(handler=dedup_stats)
+
+    command = commands.add_parser('service', help='run every bot in one process')
+    command.set_defaults(handler=service)
+
+    command = commands.add_parser('startup', help='import time and memory of each subcommand')
+    command.add_argument('commands', nargs='*', metavar='command',
+                         help=f'subcommand and its arguments, quoted (default: {", ".join(STARTUP_COMMANDS)})')
+    command.set_defaults(handler=startup)
+    return parser
+
+
+if __name__ == '__main__':
+    arguments = build_parser().parse_args()
+    arguments.handler(arguments)
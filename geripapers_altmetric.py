@@ -1,10 +1,24 @@
-from altmetric import Altmetric, AltmetricHTTPException
-import pandas as pd
+import collections
+import gzip
+import heapq
+import json
+import logging
 import time
 import os.path
-import tweepy
 import datetime
+import sys
 import config
+import metrics
+from pmid_store import open_store
+from altmetric_cache import AltmetricCache, iter_cached
+from publisher import get_publisher
+from summary_store import open_summary_store
+from storage import atomic_write, daily_snapshot, file_lock
+
+# pandas, the Altmetric client and pubmed are imported by the functions that use them, so the
+# daily run that finds it is not Sunday starts without loading them
+
+log = logging.getLogger(__name__)
 
 
 def main_file_to_list(main_database):
@@ -15,48 +29,45 @@ def main_file_to_list(main_database):
     """
     today = time.strftime("%d_%m_%Y")
 
-    with open(main_database, 'r') as main_file, open(f'{today}_pmid.txt', 'a') as copy_file:
-        for line in main_file:
-            copy_file.write(line)
+    # Dated copy of the database; rerunning on the same day rewrites it instead of appending to it
+    daily_snapshot(main_database, f'{today}_pmid.txt')
 
-    pmid_db_pd = pd.read_csv(f'{today}_pmid.txt', skip_blank_lines=True, header=None)
-    pmid_db_list = pmid_db_pd[0].values.tolist()  # turns dataframe of PMIDs into a list of PMIDs
+    return open_store(main_database).pmids()
 
-    return pmid_db_list
 
-
-def altmetric_search(list_pmids):
+def altmetric_search(list_pmids, cache_only=False):
     """
     Takes a list of PMIDs, searches Altmetric information of each PMID and saves it into a dataframe (Pandas)
     Altmetric info includes: https://api.altmetric.com/v1/doi/10.1038/480426a?callback=my_callback
+    PMIDs are fetched concurrently by AltmetricFetcher, which retries rate limited calls instead of dropping them.
+    Records are kept in the Altmetric cache and only refreshed when due (weekly for recent papers, monthly
+    for older ones); with cache_only=True no call is made and the ranking is rebuilt offline from the cache
     INPUT : list_pmids - list of PMIDs
+            cache_only - bool
     OUPUT : overall_database_pd - dataframe with all necessary info
     """
+    import pandas as pd
+    from altmetric_fetch import AltmetricFetcher, OUTCOME_MESSAGES
+
     today = time.strftime("%d_%m_%Y")
-    a = Altmetric()
+    fetcher = AltmetricFetcher(api_url=config.altmetric_api_url, api_key=config.altmetric_api_key,
+                               workers=config.altmetric_workers, rate=config.altmetric_rate)
+    cache = AltmetricCache(config.altmetric_cache_path, max_entries=config.altmetric_cache_max_entries)
 
     # New list to
     overall_list = []
+    outcomes = collections.Counter()
 
     # Iterating through List of PMIDs
-    for i in list_pmids:
-        try:
-            rsp = a.pmid(str(i))
-            if rsp is None:
-                print("PMID not found")
-            else:
-                overall_list.append(rsp)
-                print(rsp['pmid'], ': ', rsp['score'], ' - ', rsp['title'])
-        except AltmetricHTTPException as e:
-            if e.status_code == 403:
-                print("You aren't authorized for this call")
-            elif e.status_code == 420:
-                print("You are being rate limited")
-            elif e.status_code == 502:
-                print("The API version you are using is currently down for maintenance.")
-            elif e.status_code == 404:
-                print("Invalid API function")
-                print(e.msg)
+    for pmid, outcome, rsp in iter_cached(fetcher, cache, list_pmids, cache_only=cache_only):
+        outcomes[outcome] += 1
+        if rsp is None:
+            log.info('%s :  %s', pmid, OUTCOME_MESSAGES[outcome])
+        else:
+            overall_list.append(rsp)
+            log.info('%s :  %s  -  %s', rsp['pmid'], rsp['score'], rsp['title'])
+    log.info('Altmetric outcomes:  %s', dict(outcomes))
+    cache.close()
 
     # Saving all information into a dataframe
     overall_database_pd = pd.json_normalize(overall_list)
@@ -65,17 +76,120 @@ def altmetric_search(list_pmids):
     return overall_database_pd
 
 
+def project_record(rsp):
+    """
+    Keeps only the Altmetric fields used to rank papers and compose the thread
+    INPUT : rsp - Altmetric record (dict)
+    OUTPUT : dict with pmid, title, score and the cited_by_* counts
+    """
+    projection = {key: rsp.get(key) for key in ('pmid', 'title', 'score')}
+    projection.update((key, value) for key, value in rsp.items() if key.startswith('cited_by_'))
+    return projection
+
+
+def altmetric_search_streaming(list_pmids, excluded_pmids=(), k=5, spill_dir=None, chunk_size=1000,
+                               cache_only=False):
+    """
+    Bounded-memory version of altmetric_search: each Altmetric record is projected to the ranking
+    fields as it arrives and only a running top-k heap of the papers not in excluded_pmids is kept,
+    so memory does not grow with the number of PMIDs tweeted so far.
+    The full records can be spilled to disk in gzipped JSON-lines chunks of chunk_size records
+    INPUT : list_pmids - list of PMIDs
+            excluded_pmids - PMIDs already selected in previous weeks
+            k - number of papers to keep
+            spill_dir - directory for the full records (None to discard them)
+            cache_only - bool, see altmetric_search
+    OUPUT : dataframe with the full Altmetric info of the k best unselected papers, best first
+    """
+    import pandas as pd
+    from altmetric_fetch import AltmetricFetcher, OUTCOME_MESSAGES
+
+    today = time.strftime("%d_%m_%Y")
+    fetcher = AltmetricFetcher(api_url=config.altmetric_api_url, api_key=config.altmetric_api_key,
+                               workers=config.altmetric_workers, rate=config.altmetric_rate)
+    cache = AltmetricCache(config.altmetric_cache_path, max_entries=config.altmetric_cache_max_entries)
+    excluded_pmids = {str(x) for x in excluded_pmids}
+
+    top_heap = []  # (score, -arrival, record): the root is the worst of the k best papers
+    outcomes = collections.Counter()
+    spill_chunk, spill_count = [], 0
+
+    for arrival, (pmid, outcome, rsp) in enumerate(iter_cached(fetcher, cache, list_pmids, cache_only=cache_only)):
+        outcomes[outcome] += 1
+        if rsp is None:
+            log.info('%s :  %s', pmid, OUTCOME_MESSAGES[outcome])
+            continue
+        projection = project_record(rsp)
+        log.info('%s :  %s  -  %s', projection['pmid'], projection['score'], projection['title'])
+
+        if projection['score'] is not None and str(projection['pmid']) not in excluded_pmids:
+            # Ties keep the earliest PMID, like top_altmetric_papers(tie_break='first')
+            entry = (projection['score'], -arrival, rsp)
+            if len(top_heap) < k:
+                heapq.heappush(top_heap, entry)
+            elif entry[:2] > top_heap[0][:2]:
+                heapq.heapreplace(top_heap, entry)
+
+        if spill_dir is not None:
+            spill_chunk.append(rsp)
+            if len(spill_chunk) >= chunk_size:
+                spill_records(spill_chunk, spill_dir, today, spill_count)
+                spill_chunk, spill_count = [], spill_count + 1
+    if spill_dir is not None and spill_chunk:
+        spill_records(spill_chunk, spill_dir, today, spill_count)
+    log.info('Altmetric outcomes:  %s', dict(outcomes))
+    cache.close()
+
+    top_records = [entry[2] for entry in sorted(top_heap, key=lambda entry: entry[:2], reverse=True)]
+    top_database_pd = pd.json_normalize(top_records)
+    top_database_pd.insert(0, "analysis_date", today)
+    return top_database_pd
+
+
+def spill_records(records, spill_dir, today, chunk_number):
+    """
+    Writes a chunk of full Altmetric records to spill_dir/{today}_altmetric_{chunk_number}.jsonl.gz
+    """
+    os.makedirs(spill_dir, exist_ok=True)
+    with gzip.open(os.path.join(spill_dir, f'{today}_altmetric_{chunk_number:04d}.jsonl.gz'), 'wt') as spill_file:
+        for record in records:
+            spill_file.write(json.dumps(record) + '\n')
+
+
+def already_selected_pmids(output_file_name='highest_altmetric_papers.csv'):
+    """
+    OUTPUT : list of the PMIDs (str) already selected as paper of the week
+    """
+    import pandas as pd
+
+    if not os.path.exists(output_file_name):
+        return []
+    return [str(x) for x in pd.read_csv(output_file_name, usecols=['pmid'])['pmid']]
+
+
+def last_selection_date(output_file_name='highest_altmetric_papers.csv'):
+    """
+    OUTPUT : date (datetime.date) of the analysis that selected the last paper of the week, None if none was
+    """
+    import pandas as pd
+
+    if not os.path.exists(output_file_name):
+        return None
+    dates = pd.read_csv(output_file_name, usecols=['analysis_date'], dtype=str)['analysis_date'].dropna()
+    if dates.empty:
+        return None
+    return max(datetime.datetime.strptime(date, "%d_%m_%Y").date() for date in dates)
+
+
 def highest_altemtric_score(database_overall_df):
     """
     It needs a dataframe with all altmetric information for each PMID
 
     Checks whether "highest_altemtric_papers.csv" is in the system
-    if not, passes the input dataframe to new_pd
-    if it exists, takes all PMIDs already in the csv file and deletes them from the input dataframe and
-    saves the new dataframe into new_pd
+    if it exists, takes all PMIDs already in the csv file so they are excluded from the selection
 
-    From new_pd, searches the row that contains the PMID with the highest altmetric score and saves it into
-    max_altmetric_score_row
+    From the remaining PMIDs, searches the row that contains the PMID with the highest altmetric score
+    (see ranking.top_altmetric_papers) and saves it into max_altmetric_score_row
 
     Checks again whether "highest_altemtric_papers.csv" is in the system
     if not, saves max_altmetric_score_row in the .csv
@@ -84,148 +198,165 @@ def highest_altemtric_score(database_overall_df):
     INPUT : database_overall_df - pd.df - dataframe with all altmetric information for each PMID
     OUPUT : 'highest_atlemtric_papers.csv' - a .csv file with PMIDs with the highest altmetric scores
     """
+    import pandas as pd
+    from ranking import top_altmetric_papers
+
     # File to store all PMID with highest altmetric score
     output_file_name = 'highest_altmetric_papers.csv'
 
-    # If CSV with highest altmetric scores not created
-    if not os.path.exists(output_file_name):
-        new_pd = database_overall_df
-    else:
-        # Reading highest score altmetrics already used in previous tweets
-        altmetric_db = pd.read_csv('highest_altmetric_papers.csv')
+    # The read-select-rewrite below is done under the file lock, and the CSV is replaced atomically
+    with file_lock(output_file_name):
+        # If CSV with highest altmetric scores not created
+        if not os.path.exists(output_file_name):
+            altmetric_db = None
+            altmetric_pmid_list_str = []
+        else:
+            # Reading highest score altmetrics already used in previous tweets
+            altmetric_db = pd.read_csv(output_file_name)
 
-        # PMID list of highest altmetric papers and to str
-        altmetric_pmid_list = altmetric_db['pmid'].tolist()
-        altmetric_pmid_list_str = [str(x) for x in altmetric_pmid_list]
+            # PMID list of highest altmetric papers and to str
+            altmetric_pmid_list = altmetric_db['pmid'].tolist()
+            altmetric_pmid_list_str = [str(x) for x in altmetric_pmid_list]
 
-        # new dataframe including all PMIDs from overall_database_pd but without altmetric_pmid_list_str
-        new_pd = database_overall_df[~database_overall_df['pmid'].isin(altmetric_pmid_list_str)]
+        # Finding the row with highest altmetric score among the PMIDs not in altmetric_pmid_list_str
+        max_altemtric_score_row = top_altmetric_papers(database_overall_df, k=1, exclude=altmetric_pmid_list_str)
+        max_altemtric_score_row = max_altemtric_score_row.iloc[[0]]
 
-    # Finding the row with highest altmetric score
-    max_altemtric_score_row = new_pd[new_pd.score == new_pd.score.max()]
-    max_altemtric_score_row = max_altemtric_score_row.iloc[[0]]
+        # Print the PMID title and its altmetric score
+        # print(f'''\nTitle: {max_altemtric_score_row['title'].values} \nPMID: {max_altemtric_score_row['pmid'].values}''')
 
-    # Print the PMID title and its altmetric score
-    # print(f'''\nTitle: {max_altemtric_score_row['title'].values} \nPMID: {max_altemtric_score_row['pmid'].values}''')
-
-    # Save Altmetric database of a specific date - variable today - to CSV
-    # new_pd.to_csv(f'{today}_analysis.csv') #Not saving this cause it's usually >5mb
-
-    # Conditional statement -> if file exists create a new file with headers -> if not append without headers
-    if not os.path.exists(output_file_name):
-        return max_altemtric_score_row.to_csv(output_file_name, index=False), max_altemtric_score_row
-    else:
-        altmetric_db = pd.read_csv("highest_altmetric_papers.csv")
-        altmetric_db_new = pd.concat([altmetric_db, max_altemtric_score_row], sort=False)
-        return altmetric_db_new.to_csv(output_file_name, index=False), max_altemtric_score_row
+        # Conditional statement -> if file exists create a new file with headers -> if not append without headers
+        if altmetric_db is None:
+            altmetric_db_new = max_altemtric_score_row
+        else:
+            altmetric_db_new = pd.concat([altmetric_db, max_altemtric_score_row], sort=False)
+        with atomic_write(output_file_name, newline='') as output_file:
+            return altmetric_db_new.to_csv(output_file, index=False), max_altemtric_score_row
 
 
 def pubmed_search_individual(pmid):
     """
-    Searches PMID in pubmed and retrieves PUBMED related information
+    Retrieves PUBMED related information of a PMID
+    It is read from the summary store filled by pubmed.py when the article was tweeted,
+    PubMed is only searched if the PMID is not there
     INPUT : pmid - a string
-    OUPUT : my_record[0] - a 'Bio.Entrez.Parser.DictionaryElement'
+    OUPUT : dict with 'Title', 'AuthorList', 'Source', 'FullJournalName' and 'PubDate'
+    """
+    from pubmed import fetch_summaries
+
+    return open_summary_store(config.pubmed_summaries_path).get(pmid, fetch=fetch_summaries)
+
+
+
+def weekly_thread(cache_only=False):
     """
-    from Bio import Entrez
+    Weekly #Geripaper of the week: ranks every PMID tweeted to date by Altmetric score and
+    posts the 3-tweet thread on the paper with the highest score not selected before
+    INPUT : cache_only(bool) - rebuild the ranking from the Altmetric cache without calling Altmetric
+    OUTPUT : list of tweet ids
+    """
+    import pandas as pd
+    from snapshot_store import write_snapshot
+
+    pmid_list = main_file_to_list('pmid_db.txt')  # Creates a list of all PMIDs used to date
+    # Retrieves all altmetric info of each PMIDs
+    with metrics.span('altmetric_search', streaming=config.altmetric_streaming, cache_only=cache_only):
+        if config.altmetric_streaming:
+            # Bounded memory: only the best unselected papers are kept, full records are spilled to disk
+            overall_pmid_altmetric_df = altmetric_search_streaming(
+                pmid_list, already_selected_pmids(), spill_dir=config.altmetric_spill_dir, cache_only=cache_only)
+        else:
+            overall_pmid_altmetric_df = altmetric_search(pmid_list, cache_only=cache_only)
+            # Keeps the full weekly analysis as a compressed Parquet snapshot for trend analysis;
+            # the snapshot is an extra, a failure to write it never stops the weekly thread
+            try:
+                write_snapshot(overall_pmid_altmetric_df, config.altmetric_snapshot_dir)
+            except ImportError as e:
+                log.warning(e)
+            except Exception:
+                log.exception('Altmetric snapshot not written')
+    with metrics.span('ranking'):
+        csv_file, row_max_altmetric_score = highest_altemtric_score(overall_pmid_altmetric_df)
+
+    # PMID with the highest altmetric score
+    pmid = row_max_altmetric_score['pmid'].values[0]
 
-    Entrez.email = config.pubmed_email
-    Entrez.api_key = config.pubmed_api_key
+    # Altmetric value of PMID with highest Altmetric score
+    score = round(row_max_altmetric_score['score'].values[0])
 
-    pmid_search = Entrez.esummary(db="pubmed", id=pmid)
-    my_record = Entrez.read(pmid_search)
+    # Retrieves pubmed information for the PMID with the highest altmetric score
+    my_pmid = pubmed_search_individual(pmid)
+    # Storing pubmed information
+    journal_name_short = my_pmid['Source']
+    journal_name_full = my_pmid['FullJournalName']
+    pub_date = my_pmid['PubDate']
+    first_author_etal = my_pmid['AuthorList'][0] + " et al."
+    title = my_pmid['Title']
 
-    return my_record[0]
+    # PubMed Link to be used in the tweets
+    pre_link_pmid = "http://pubmed.ncbi.nlm.nih.gov/"
+    full_link_pmid = pre_link_pmid + pmid
+
+    # Emojis and their codes for tweets
+    party_emoji = u'\U0001f389'
+    fire_emoji = u'\U0001f525'
+    journal_emoji = u'\U0001f4f0'
+    thread_emoji = u'\U0001F9F5'
+    point_down_emoji_medium_tone = u"\U0001F447\U0001F3FD"
+    bookmark_paper_emoji = u'\U0001f4d1'
+
+    # Creating First tweet
+    first_tweet = f'Check out the #Geripaper of the week! {party_emoji}{party_emoji}{party_emoji}\n' \
+                  f'Of all the articles tweeted by @GeriPapers, the article by {first_author_etal} published in ' \
+                  f'"{journal_name_short}" received the highest attention on the internet. ' \
+                  f'Check it out {point_down_emoji_medium_tone} (1/3 {thread_emoji}) {full_link_pmid}'
+
+    # Second tweet
+    second_tweet = f'''We used the @Altmetric Attention Score to select the article with the highest online activity. This article's total score was {fire_emoji}{score}{fire_emoji} and was mentioned by:\n'''
+
+    if 'cited_by_tweeters_count' in row_max_altmetric_score and pd.notna(
+            row_max_altmetric_score['cited_by_tweeters_count'].values[0]):
+        twitter = f'''{round(row_max_altmetric_score['cited_by_tweeters_count'].values[0])} Twitter users\n'''
+        second_tweet += twitter
+
+    if 'cited_by_fbwalls_count' in row_max_altmetric_score and pd.notna(
+            row_max_altmetric_score['cited_by_fbwalls_count'].values[0]):
+        facebook = f'''{round(row_max_altmetric_score['cited_by_fbwalls_count'].values[0])} Facebook users\n'''
+        second_tweet += facebook
+
+    if 'cited_by_msm_count' in row_max_altmetric_score.columns and pd.notna(
+            row_max_altmetric_score['cited_by_msm_count'].values[0]):
+        news_media = f'''{round(row_max_altmetric_score['cited_by_msm_count'].values[0])} News Media outlets\n'''
+        second_tweet += news_media
+
+    if 'cited_by_wikipedia_count' in row_max_altmetric_score.columns and pd.notna(
+            row_max_altmetric_score['cited_by_wikipedia_count'].values[0]):
+        wiki = f'''{round(row_max_altmetric_score['cited_by_wikipedia_count'].values[0])} Wikipedia pages\n'''
+        second_tweet += wiki
+
+    if 'cited_by_feeds_count' in row_max_altmetric_score.columns and pd.notna(
+            row_max_altmetric_score['cited_by_feeds_count'].values[0]):
+        blogs = f'''{round(row_max_altmetric_score['cited_by_feeds_count'].values[0])} Blogs\n'''
+        second_tweet += blogs
+
+    second_tweet += f'(2/3 {thread_emoji})'
+
+    # Third tweet
+    third_tweet = f'''Every week, @GeriPapers highlights a new research article in the field of Geriatrics that has received the highest attention on the internet. If you know any of the authors of this article, feel free to tag them. Stay tuned for next week's article {bookmark_paper_emoji}! (3/3 {thread_emoji})'''
+
+
+    # Generating the thread for @GeriPapers
+    with metrics.span('thread'):
+        return get_publisher().post_thread([first_tweet, second_tweet, third_tweet])
 
 
 if __name__ == '__main__':
     today = datetime.date.today()
     weekday = today.weekday()
 
-    if weekday == 6:  # This conditional statement will let you run the file once week
-        pmid_list = main_file_to_list('pmid_db.txt')  # Creates a list of all PMIDs used to date
-        overall_pmid_altmetric_df = altmetric_search(pmid_list)  # Retrieves all altmetric info of each PMIDs
-        csv_file, row_max_altmetric_score = highest_altemtric_score(overall_pmid_altmetric_df)
-
-        # PMID with the highest altmetric score
-        pmid = row_max_altmetric_score['pmid'].values[0]
-
-        # Altmetric value of PMID with highest Altmetric score
-        score = round(row_max_altmetric_score['score'].values[0])
-
-        # Retrieves pubmed information for the PMID with the highest altmetric score
-        my_pmid = pubmed_search_individual(pmid)
-        # Storing pubmed information
-        journal_name_short = my_pmid['Source']
-        journal_name_full = my_pmid['FullJournalName']
-        pub_date = my_pmid['PubDate']
-        first_author_etal = my_pmid['AuthorList'][0] + " et al."
-        title = my_pmid['Title']
-
-        # PubMed Link to be used in the tweets
-        pre_link_pmid = "http://pubmed.ncbi.nlm.nih.gov/"
-        full_link_pmid = pre_link_pmid + pmid
-
-        # Emojis and their codes for tweets
-        party_emoji = u'\U0001f389'
-        fire_emoji = u'\U0001f525'
-        journal_emoji = u'\U0001f4f0'
-        thread_emoji = u'\U0001F9F5'
-        point_down_emoji_medium_tone = u"\U0001F447\U0001F3FD"
-        bookmark_paper_emoji = u'\U0001f4d1'
-
-        # Creating First tweet
-        first_tweet = f'Check out the #Geripaper of the week! {party_emoji}{party_emoji}{party_emoji}\n' \
-                      f'Of all the articles tweeted by @GeriPapers, the article by {first_author_etal} published in ' \
-                      f'"{journal_name_short}" received the highest attention on the internet. ' \
-                      f'Check it out {point_down_emoji_medium_tone} (1/3 {thread_emoji}) {full_link_pmid}'
-
-        # Second tweet
-        second_tweet = f'''We used the @Altmetric Attention Score to select the article with the highest online activity. This article's total score was {fire_emoji}{score}{fire_emoji} and was mentioned by:\n'''
-
-        if 'cited_by_tweeters_count' in row_max_altmetric_score and pd.notna(
-                row_max_altmetric_score['cited_by_tweeters_count'].values[0]):
-            twitter = f'''{round(row_max_altmetric_score['cited_by_tweeters_count'].values[0])} Twitter users\n'''
-            second_tweet += twitter
-
-        if 'cited_by_fbwalls_count' in row_max_altmetric_score and pd.notna(
-                row_max_altmetric_score['cited_by_fbwalls_count'].values[0]):
-            facebook = f'''{round(row_max_altmetric_score['cited_by_fbwalls_count'].values[0])} Facebook users\n'''
-            second_tweet += facebook
-
-        if 'cited_by_msm_count' in row_max_altmetric_score.columns and pd.notna(
-                row_max_altmetric_score['cited_by_msm_count'].values[0]):
-            news_media = f'''{round(row_max_altmetric_score['cited_by_msm_count'].values[0])} News Media outlets\n'''
-            second_tweet += news_media
-
-        if 'cited_by_wikipedia_count' in row_max_altmetric_score.columns and pd.notna(
-                row_max_altmetric_score['cited_by_wikipedia_count'].values[0]):
-            wiki = f'''{round(row_max_altmetric_score['cited_by_wikipedia_count'].values[0])} Wikipedia pages\n'''
-            second_tweet += wiki
-
-        if 'cited_by_feeds_count' in row_max_altmetric_score.columns and pd.notna(
-                row_max_altmetric_score['cited_by_feeds_count'].values[0]):
-            blogs = f'''{round(row_max_altmetric_score['cited_by_feeds_count'].values[0])} Blogs\n'''
-            second_tweet += blogs
-
-        second_tweet += f'(2/3 {thread_emoji})'
-
-        # Third tweet
-        third_tweet = f'''Every week, @GeriPapers highlights a new research article in the field of Geriatrics that has received the highest attention on the internet. If you know any of the authors of this article, feel free to tag them. Stay tuned for next week's article {bookmark_paper_emoji}! (3/3 {thread_emoji})'''
-
-
-        # Generating tweets for @GeriPapers
-        auth = tweepy.OAuthHandler(config.api_key, config.api_key_secret)
-        auth.set_access_token(config.access_token, config.access_token_secret)
-        api = tweepy.API(auth)
-
-        # First tweet
-        original_tweet = api.update_status(status=first_tweet)
-        # Second tweet
-        tweet2 = api.update_status(status=second_tweet, in_reply_to_status_id=original_tweet.id,
-                                   auto_populate_reply_metadata=True)
-        # Third tweet
-        tweet3 = api.update_status(status=third_tweet, in_reply_to_status_id=tweet2.id,
-                                   auto_populate_reply_metadata=True)
-
-    else:
-        print('It is not Sunday')
+    with metrics.run('altmetric'):
+        if weekday == 6:  # This conditional statement will let you run the file once week
+            # --cache-only rebuilds the ranking without calling Altmetric
+            weekly_thread(cache_only='--cache-only' in sys.argv)
+        else:
+            log.info('It is not Sunday')
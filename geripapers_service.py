@@ -0,0 +1,218 @@
+"""
+Single always-on process running the three bots as cooperative asyncio tasks:
+- the PubMed sweep (every config.service_sweep_interval seconds) and the publishing of the queued articles
+- the weekly Altmetric thread (Sundays at config.service_weekly_hour)
+- the hashtag stream (if config.service_stream)
+They share one Twitter client, one Entrez rate limiter and the same stores. The time of the last run of
+each scheduled job is kept in config.service_state_path (for the weekly thread, the last analysis date in
+highest_altmetric_papers.csv counts too), so a restart neither repeats nor skips a job.
+SIGTERM/SIGINT stop the service gracefully: running jobs finish, queued retweets are sent (within 30 s),
+then it exits. Waits for the Twitter rate budget are cut short, so a shutdown never waits hours for them.
+Run: python geripapers_service.py
+"""
+import asyncio
+import datetime
+import json
+import logging
+import os
+import signal
+import threading
+
+import config
+import metrics
+from storage import atomic_write
+
+log = logging.getLogger(__name__)
+
+PMID_DB = 'pmid_db.txt'
+
+# Longest single wait of the scheduler, so a clock change or a suspended host is caught up quickly
+MAX_WAIT = 300
+
+# Wait before retrying a job that failed
+RETRY_DELAY = 15 * 60
+
+
+class Every:
+    """
+    Schedule of a job run every `interval` seconds (right away the first time)
+    """
+
+    def __init__(self, interval):
+        self.interval = datetime.timedelta(seconds=interval)
+
+    def next_run(self, last_run, now):
+        return now if last_run is None else last_run + self.interval
+
+
+class Weekly:
+    """
+    Schedule of a job run once a week, on `weekday` (Monday is 0) at `hour`.
+    A run missed while the service was down is made as soon as it starts again
+    """
+
+    def __init__(self, weekday, hour):
+        self.weekday = weekday
+        self.hour = hour
+
+    def next_run(self, last_run, now):
+        start = last_run or now.replace(hour=0, minute=0, second=0, microsecond=0)
+        candidate = start.replace(hour=self.hour, minute=0, second=0, microsecond=0) + \
+            datetime.timedelta(days=(self.weekday - start.weekday()) % 7)
+        if last_run is not None and candidate <= last_run:
+            candidate += datetime.timedelta(days=7)
+        return candidate
+
+
+class ServiceState:
+    """
+    Time of the last run of each scheduled job, saved atomically in a JSON file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._runs = {}
+        if os.path.exists(path):
+            with open(path) as state_json:
+                self._runs = json.load(state_json)
+
+    def last_run(self, job):
+        last_run = self._runs.get(job)
+        return None if last_run is None else datetime.datetime.fromisoformat(last_run)
+
+    def record(self, job, when):
+        self._runs[job] = when.isoformat()
+        with atomic_write(self.path) as state_json:
+            json.dump(self._runs, state_json)
+
+
+async def wait_or_stop(stop, seconds):
+    """
+    OUTPUT : True if stop was set before `seconds` elapsed
+    """
+    try:
+        await asyncio.wait_for(stop.wait(), timeout=max(seconds, 0))
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+def run_traced(name, job):
+    with metrics.span(name):
+        return job()
+
+
+async def run_scheduled(name, schedule, job, state, stop, retry_delay=RETRY_DELAY, last_done=None):
+    """
+    Runs job (a blocking callable, on a worker thread) whenever schedule says it is due, until stop is set.
+    The run is recorded in state once the job has succeeded; a failed job is retried after retry_delay seconds.
+    last_done (callable) gives the time the job last took effect, if the job keeps it itself: the weekly
+    thread is done once the paper of the week is written to highest_altmetric_papers.csv, so a thread that
+    failed after that point is not posted again, and a service started after a thread was posted waits
+    for the next week
+    """
+    def last_run():
+        runs = [state.last_run(name), last_done() if last_done is not None else None]
+        return max((run for run in runs if run is not None), default=None)
+
+    while not stop.is_set():
+        now = datetime.datetime.now()
+        delay = (schedule.next_run(last_run(), now) - now).total_seconds()
+        if delay > 0:
+            await wait_or_stop(stop, min(delay, MAX_WAIT))
+            continue
+        log.info('Running %s', name)
+        try:
+            await asyncio.to_thread(run_traced, name, job)
+        except Exception:
+            log.exception('%s failed', name)
+            metrics.count('service_jobs_total', job=name, outcome='error')
+            await wait_or_stop(stop, retry_delay)
+            continue
+        metrics.count('service_jobs_total', job=name, outcome='ok')
+        state.record(name, now)
+
+
+def last_weekly_thread():
+    """
+    OUTPUT : end of the day (datetime) of the analysis that selected the last paper of the week, None if none was
+    """
+    from geripapers_altmetric import last_selection_date
+
+    selected = last_selection_date()
+    return None if selected is None else datetime.datetime.combine(selected, datetime.time.max)
+
+
+async def run_stream(publisher, stop):
+    """
+    Hashtag stream on its own thread (tweepy reconnects by itself), retweeting through the shared publisher
+    """
+    from hashtag_reteweet import KEYWORDS, Listener, RetweetPipeline
+
+    pipeline = RetweetPipeline(publisher).start()
+    stream = Listener(config.api_key, config.api_key_secret, config.access_token, config.access_token_secret,
+                      pipeline=pipeline)
+    stream_thread = stream.filter(track=KEYWORDS, threaded=True)
+    await stop.wait()
+    stream.disconnect()
+    await asyncio.to_thread(stream_thread.join, 30)
+    await asyncio.to_thread(pipeline.stop, 30)  # sends the retweets already queued
+
+
+async def main(dry_run=False):
+    """
+    INPUT : dry_run(bool) - only import the bots (geripapers.py --dry-run service)
+    """
+    from geripapers_altmetric import weekly_thread
+    from publish_queue import PublishQueue, run_publisher
+    from publisher import get_publisher
+    from pubmed import GERIATRIC_QUERY, discover_articles, entrez_limiter, post_article
+
+    if dry_run:
+        return
+
+    # Clients shared by every task, created once
+    publisher = get_publisher()
+    entrez_limiter()
+    publish_queue = PublishQueue(config.publish_queue_path)
+    state = ServiceState(config.service_state_path)
+
+    stop = asyncio.Event()  # for the asyncio tasks
+    stopping = threading.Event()  # for the publisher thread
+
+    def request_stop():
+        if not stop.is_set():
+            log.info('Stopping')
+        stop.set()
+        stopping.set()
+        publisher.budget.stop()  # a tweet waiting for the rate budget is not sent
+
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, request_stop)
+
+    tasks = [
+        run_scheduled('pubmed_sweep', Every(config.service_sweep_interval),
+                      lambda: discover_articles(GERIATRIC_QUERY, 300, PMID_DB, publish_queue,
+                                                state_file=config.pubmed_state_path),
+                      state, stop),
+        # One tweet every config.publish_interval seconds, as articles are found by the sweeps
+        asyncio.to_thread(run_publisher, publish_queue, lambda pmid, text: post_article(pmid, text, PMID_DB),
+                          config.publish_interval, stop_when_empty=False, stop=stopping),
+        run_scheduled('weekly_thread', Weekly(6, config.service_weekly_hour), weekly_thread, state, stop,
+                      last_done=last_weekly_thread),
+    ]
+    if config.service_stream:
+        tasks.append(run_stream(publisher, stop))
+    tasks = [asyncio.ensure_future(task) for task in tasks]
+    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    request_stop()  # after a signal every task is done; if one task crashed, the others are stopped too
+    await asyncio.gather(*tasks, return_exceptions=True)
+    publish_queue.close()
+    for task in done:
+        task.result()  # re-raises the error of a crashed task
+
+
+if __name__ == '__main__':
+    with metrics.run('service'):
+        asyncio.run(main())
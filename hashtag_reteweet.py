@@ -1,42 +1,204 @@
-import tweepy
+import collections
+import json
+import logging
+import queue
+import sys
+import threading
 import time
+
+import tweepy
 import config
+import metrics
+from publisher import BudgetStopped, FakeBackend, Publisher, RateBudget, get_publisher
+
+log = logging.getLogger(__name__)
+
+# Keywords to be searched by the twitter streaming
+KEYWORDS = ['#geripapers', '#geripaper', '#geritwitter', '#gerijc']
+
+
+class RetweetPipeline:
+    """
+    Retweets streamed statuses on a pool of worker threads.
+    The stream callback only pushes statuses onto a bounded queue (dropping them when it is full),
+    so a burst of tweets never slows down the reading of the stream. Workers dedupe statuses by id,
+    apply the retweet/quote/own-tweet filters and retweet within the publisher's rate budget.
+    """
+
+    def __init__(self, publisher, workers=2, max_queue=1000, dedupe_window=10000):
+        self.publisher = publisher
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._seen = collections.OrderedDict()
+        self._dedupe_window = dedupe_window
+        self._lock = threading.Lock()
+        self._threads = []
+        self._latencies = collections.deque(maxlen=1000)
+        self.counts = collections.Counter()
+
+    def start(self):
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, status, block=False):
+        """
+        Queues the status; when the queue is full it is dropped, or with block=True (replays, where
+        the result must not depend on the speed of the machine) waited for
+        INPUT : status - tweepy Status, block(bool)
+        OUTPUT : True if the status was queued
+        """
+        try:
+            self._queue.put((time.monotonic(), status), block=block)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('received')
+        return True
+
+    def stop(self, timeout=None):
+        """
+        Waits up to timeout seconds (None: no limit) for the queued statuses to be handled, then stops
+        the workers. Statuses still queued at the deadline are dropped; a worker blocked in the rate
+        budget is left behind (its thread is a daemon) unless the budget is stopped too
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._queue.all_tasks_done.wait(remaining)
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            self._count('dropped')
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        self._threads = []
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+        metrics.count('retweet_pipeline_total', outcome=name)
 
-# authentication
-auth = tweepy.OAuthHandler(config.api_key, config.api_key_secret)
-auth.set_access_token(config.access_token, config.access_token_secret)
-api = tweepy.API(auth)
+    def _first_time_seen(self, status_id):
+        with self._lock:
+            if status_id in self._seen:
+                return False
+            self._seen[status_id] = None
+            if len(self._seen) > self._dedupe_window:
+                self._seen.popitem(last=False)
+            return True
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            queued_at, status = item
+            try:
+                self._count(self.handle(status))
+            except BudgetStopped:
+                self._count('interrupted')
+            except Exception as e:
+                log.error(e)
+                self._count('error')
+            finally:
+                latency = time.monotonic() - queued_at
+                with self._lock:
+                    self._latencies.append(latency)
+                metrics.observe('retweet_latency_seconds', latency)
+                self._queue.task_done()
+
+    def handle(self, status):
+        """
+        Ignores duplicates, retweets ("retweeted_status"), quoted tweets ("quoted_status") and
+        tweets from the bot itself (@geripapers); retweets everything else
+        INPUT : status - tweepy Status
+        OUTPUT : outcome(str)
+        """
+        if not self._first_time_seen(status.id):
+            return 'duplicate'
+        if hasattr(status, "retweeted_status"):
+            log.info('A retweet')
+            return 'retweet_ignored'
+        if hasattr(status, "quoted_status"):
+            log.info('A quoted tweet')
+            return 'quote_ignored'
+        if self.publisher.is_own(status):
+            log.info('Own tweet')
+            return 'own_ignored'
+        log.info(f'{status.user.id} - {status.user.screen_name}: {status.text}')
+        self.publisher.retweet(status.id)
+        return 'retweeted'
+
+    def stats(self):
+        """
+        OUTPUT : dict with the queue depth, the outcome counters and the end-to-end latency
+                 (seconds from the stream callback to the retweet) over the last 1000 statuses
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self.counts, queue_depth=self._queue.qsize())
+        if latencies:
+            stats.update(latency_p50=latencies[len(latencies) // 2],
+                         latency_p95=latencies[int(len(latencies) * 0.95)],
+                         latency_max=latencies[-1])
+        return stats
 
 
 class Listener(tweepy.Stream):
+    def __init__(self, *args, pipeline=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pipeline = pipeline or RetweetPipeline(get_publisher()).start()
+
     def on_status(self, status):
         """
         We initiate Listener and run on_status to handle tweets root-level attributes
 
         Once Listener(tweepy.Stream) is set up and finds tweets with specific keywords (hashtags)
-        which will be set up below, it will ignore those tweets that has
-        the following attributes: "retweeted_status" (retweet) and "quoted_status" (quoted tweet),
-        and those tweets from a specific user (@geripapers).
-        This Listener is set to tweet those tweets that do not meet any of the aforementioned characteristics.
+        which will be set up below, it hands them to the RetweetPipeline and returns immediately.
+        The pipeline ignores those tweets that has the following attributes: "retweeted_status" (retweet)
+        and "quoted_status" (quoted tweet), and those tweets from a specific user (@geripapers), and
+        retweets those tweets that do not meet any of the aforementioned characteristics.
         """
-        if hasattr(status, "retweeted_status"):
-            print('A retweet')
-            return
-        if hasattr(status, "quoted_status"):
-            print('A quoted tweet')
-            return
-        if status.user.id == api.verify_credentials()._json['id']:
-            print('Own tweet')
-        else:
-            print(f'{status.user.id} - {status.user.screen_name}: {status.text}')
-            api.retweet(status.id)
-        time.sleep(0.2)
+        self.pipeline.submit(status)
+
+
+def replay_stream(path, pipeline):
+    """
+    Feeds a recorded stream (one status JSON per line, as sent by the Twitter streaming API) to the pipeline,
+    waiting for room in its queue so that no status is dropped
+    INPUT : path(str) - .jsonl file, pipeline - RetweetPipeline
+    OUTPUT : pipeline stats (dict) once every status has been handled
+    """
+    with open(path) as recorded:
+        for line in recorded:
+            if line.strip():
+                pipeline.submit(tweepy.models.Status.parse(None, json.loads(line)), block=True)
+    pipeline.stop()
+    return pipeline.stats()
 
 
 if __name__ == '__main__':
-    # Setting up the Listener with own twitter API authentication details
-    stream_tweet = Listener(config.api_key, config.api_key_secret, config.access_token, config.access_token_secret)
-    # Setting up keywords to be searched by the twitter streaming
-    keywords = ['#geripapers', '#geripaper', '#geritwitter', '#gerijc']
-    # Initiate twitter streaming
-    stream_tweet.filter(track=keywords)
+    if len(sys.argv) == 3 and sys.argv[1] == '--replay':
+        # Offline run: replays a recorded stream against the fake Twitter backend
+        publisher = Publisher(FakeBackend(), RateBudget(limit=float('inf')))
+        print(replay_stream(sys.argv[2], RetweetPipeline(publisher).start()))
+        sys.exit()
+
+    with metrics.run('hashtag'):
+        # Setting up the Listener with own twitter API authentication details
+        stream_tweet = Listener(config.api_key, config.api_key_secret, config.access_token,
+                                config.access_token_secret)
+        # Initiate twitter streaming
+        stream_tweet.filter(track=KEYWORDS)
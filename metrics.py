@@ -0,0 +1,244 @@
+import contextlib
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+import config
+import storage
+
+# Upper bounds (seconds) of the histogram buckets: from a cached lookup to a full weekly sweep
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """
+    Counters and histograms of the bots, keyed by name and labels, e.g.
+    altmetric_responses_total{code="420"} or entrez_request_seconds{endpoint="esummary"}.
+    Labels must have few values (endpoint, status code, outcome), never a PMID.
+    Finished spans (timed pipeline stages) go to the JSONL log when one is configured.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._local = threading.local()
+        self._span_ids = itertools.count(1)
+        self._jsonl = None
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def count(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+            self._histograms[key].observe(value)
+
+    @contextlib.contextmanager
+    def timed(self, name, **labels):
+        """
+        Observes the duration of the block in the histogram name_seconds
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name + '_seconds', time.perf_counter() - start, **labels)
+
+    @contextlib.contextmanager
+    def span(self, name, **labels):
+        """
+        Times one pipeline stage (stage_seconds{stage=name}) and logs it to the JSONL log with its
+        parent stage, so a run can be read back as a tree of stages
+        """
+        stack = self._local.__dict__.setdefault('spans', [])
+        span_id = next(self._span_ids)
+        parent = stack[-1] if stack else None
+        stack.append(span_id)
+        started_at, start = time.time(), time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            self.observe('stage_seconds', duration, stage=name)
+            self.write_event(dict(type='span', name=name, id=span_id, parent=parent, start=started_at,
+                                  duration=duration, error=error, labels=labels))
+
+    def write_event(self, event):
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.write(json.dumps(event, default=str) + '\n')
+                self._jsonl.flush()
+
+    def open_jsonl(self, path):
+        with self._lock:
+            self._jsonl = open(path, 'a')
+
+    def close_jsonl(self):
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+
+    def snapshot(self):
+        """
+        OUTPUT : dict {'counters': [...], 'histograms': [...]} of the current values
+        """
+        with self._lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self._counters.items())],
+                'histograms': [{'name': name, 'labels': dict(labels), 'count': histogram.count,
+                                'sum': histogram.sum, 'buckets': dict(zip(histogram.buckets, histogram.counts))}
+                               for (name, labels), histogram in sorted(self._histograms.items())],
+            }
+
+    def prometheus_text(self):
+        """
+        OUTPUT : every metric in the Prometheus text exposition format (str)
+        """
+        def label_text(labels, **extra):
+            pairs = list(labels) + sorted(extra.items())
+            if not pairs:
+                return ''
+            return '{' + ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                                  for key, value in pairs) + '}'
+
+        lines, typed = [], set()
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} counter')
+                    typed.add(name)
+                lines.append(f'{name}{label_text(labels)} {value}')
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} histogram')
+                    typed.add(name)
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{label_text(labels, le=bound)} {cumulative}')
+                lines.append(f'{name}_sum{label_text(labels)} {histogram.sum}')
+                lines.append(f'{name}_count{label_text(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def export_prometheus(self, path):
+        """
+        Rewrites path atomically, so a Prometheus textfile collector never reads half a file
+        """
+        text = self.prometheus_text()
+        with storage.atomic_write(path) as prometheus_file:
+            prometheus_file.write(text)
+
+
+REGISTRY = Registry()
+count = REGISTRY.count
+observe = REGISTRY.observe
+timed = REGISTRY.timed
+span = REGISTRY.span
+
+
+class JsonlHandler(logging.Handler):
+    """
+    Copies log records to the JSONL log next to the spans
+    """
+
+    def __init__(self, registry):
+        super().__init__()
+        self.registry = registry
+
+    def emit(self, record):
+        self.registry.write_event(dict(type='log', time=record.created, level=record.levelname,
+                                       logger=record.name, message=record.getMessage()))
+
+
+def export(job):
+    """
+    Writes the current metrics to config.metrics_dir/<job>.prom (if config.metrics_dir is set)
+    INPUT : job(str) - 'pubmed', 'altmetric' or 'hashtag'
+    OUTPUT : None
+    """
+    if config.metrics_dir:
+        REGISTRY.export_prometheus(os.path.join(config.metrics_dir, f'{job}.prom'))
+
+
+@contextlib.contextmanager
+def run(job, export_interval=60):
+    """
+    Instrumentation of one run of a bot: logs to stdout (the messages the bots used to print),
+    spans and logs to config.metrics_dir/<job>.jsonl, metrics exported to config.metrics_dir/<job>.prom
+    every export_interval seconds and at the end, and, with probability config.profile_sample_rate,
+    a cProfile of the run (main thread) saved in config.profile_dir
+    INPUT : job(str), export_interval(int) - seconds
+    """
+    logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+    stop = threading.Event()
+    handler = None
+    if config.metrics_dir:
+        os.makedirs(config.metrics_dir, exist_ok=True)
+        REGISTRY.open_jsonl(os.path.join(config.metrics_dir, f'{job}.jsonl'))
+        handler = JsonlHandler(REGISTRY)
+        logging.getLogger().addHandler(handler)
+
+        def export_periodically():  # always-on bots never reach the final export
+            while not stop.wait(export_interval):
+                export(job)
+
+        threading.Thread(target=export_periodically, daemon=True).start()
+
+    profiler = None
+    if config.profile_sample_rate and random.random() < config.profile_sample_rate:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with span(job):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(config.profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(config.profile_dir, f'{job}_{time.strftime("%Y%m%d_%H%M%S")}.prof'))
+        stop.set()
+        export(job)
+        if handler is not None:
+            logging.getLogger().removeHandler(handler)
+        REGISTRY.close_jsonl()
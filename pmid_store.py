@@ -0,0 +1,128 @@
+import os
+import threading
+
+import metrics
+from storage import append_lines, file_lock
+
+
+class PmidStore:
+    """
+    Indexed view of the append-only PMID database (pmid_db.txt - one PMID per line).
+    The file is read once per process into a set; new PMIDs are appended to the file
+    and, once they are on disk, to the index, so lookups never touch the disk again.
+    Appends made by other processes are picked up by refresh(); writers hold the file lock.
+    One store can be shared by the threads of a process (see geripapers_service.py).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._order = []
+        self._index = set()
+        self._offset = 0
+        self._lock = threading.RLock()
+        self.refresh()
+
+    def refresh(self, repair=False):
+        """
+        Reads any lines appended to the file since the last read
+        A last line without its newline (a crash in the middle of an append, or a hand-edited file)
+        is never indexed while another process may still be writing it. With repair=True (only while
+        holding the file lock) it is settled so the next append starts clean: a valid PMID gets its
+        newline and is indexed, anything else is cut from the file
+        INPUT : repair(bool)
+        OUTPUT : None
+        """
+        with self._lock:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == self._offset:
+                return
+            with metrics.timed('file_read', kind='pmid_db'), open(self.path, 'rb+' if repair else 'rb') as db:
+                db.seek(self._offset)
+                data = db.read()
+                end = data.rfind(b'\n') + 1
+                if repair and end < len(data):
+                    if data[end:].strip().isdigit():
+                        db.write(b'\n')
+                        db.flush()
+                        os.fsync(db.fileno())
+                        data += b'\n'
+                        end = len(data)
+                    else:
+                        db.truncate(self._offset + end)
+            self._offset += end
+            for line in data[:end].decode().splitlines():
+                self._index_pmid(line.strip())
+
+    def _index_pmid(self, pmid):
+        if pmid and pmid not in self._index:
+            self._index.add(pmid)
+            self._order.append(pmid)
+            return True
+        return False
+
+    def __contains__(self, pmid):
+        return str(pmid) in self._index
+
+    def __len__(self):
+        return len(self._order)
+
+    def pmids(self):
+        """
+        OUTPUT : list of every PMID in the store, in the order they were added
+        """
+        with self._lock:
+            return list(self._order)
+
+    def filter_new(self, pmids):
+        """
+        Bulk check of a whole search result against the store
+        INPUT : pmids - iterable of PMIDs
+        OUTPUT : list of the PMIDs (str) not in the store yet, in input order and without duplicates
+        """
+        with self._lock:
+            self.refresh()
+            new, seen = [], set()
+            for pmid in map(str, pmids):
+                if pmid not in self._index and pmid not in seen:
+                    seen.add(pmid)
+                    new.append(pmid)
+                else:
+                    metrics.count('pmid_dedup_hits_total')
+        return new
+
+    def add_many(self, pmids):
+        """
+        Appends the PMIDs not in the store yet with a single locked write and fsync
+        INPUT : pmids - iterable of PMIDs
+        OUTPUT : list of the PMIDs (str) that were added
+        """
+        with self._lock, file_lock(self.path):
+            self.refresh(repair=True)
+            added = [pmid for pmid in self.filter_new(pmids) if pmid]
+            # Indexed only once on disk: if the write or the fsync fails, the PMIDs are still new
+            append_lines(self.path, added)
+            for pmid in added:
+                self._index_pmid(pmid)
+            self._offset += sum(len(pmid.encode()) + 1 for pmid in added)
+        return added
+
+    def add(self, pmid):
+        """
+        INPUT : pmid(str)
+        OUTPUT : True if the PMID was added, False if it was already in the store
+        """
+        return bool(self.add_many([pmid]))
+
+
+_stores = {}
+
+
+def open_store(path):
+    """
+    Returns the PmidStore for path, loading it the first time it is requested in this process
+    INPUT : path(str) - path to pmid_db.txt
+    OUTPUT : PmidStore
+    """
+    key = os.path.abspath(path)
+    if key not in _stores:
+        _stores[key] = PmidStore(path)
+    return _stores[key]
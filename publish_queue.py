@@ -0,0 +1,161 @@
+import logging
+import sqlite3
+import threading
+import time
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+PENDING = 'pending'
+POSTED = 'posted'
+FAILED = 'failed'
+
+
+class PublishQueue:
+    """
+    Durable (SQLite) queue of tweets waiting to be published.
+    Discovering an article and posting it are separate states, so articles found by a
+    sweep survive a restart of the process and are posted later at the publishing cadence.
+    The connection is shared by the threads of a process (discovery and publishing), one call at a time.
+    """
+
+    def __init__(self, path, max_attempts=3, clock=time.time):
+        self.max_attempts = max_attempts
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS queue (
+                                pmid TEXT PRIMARY KEY,
+                                text TEXT NOT NULL,
+                                state TEXT NOT NULL,
+                                discovered_at REAL NOT NULL,
+                                posted_at REAL,
+                                status_id TEXT,
+                                attempts INTEGER NOT NULL DEFAULT 0,
+                                last_error TEXT)''')
+        self._db.commit()
+
+    def enqueue(self, pmid, text):
+        """
+        Adds a discovered article; articles already queued (in any state) are ignored
+        INPUT : pmid(str), text(str) - text to tweet
+        OUTPUT : True if the article was added
+        """
+        with self._lock:
+            cursor = self._db.execute('INSERT OR IGNORE INTO queue (pmid, text, state, discovered_at) '
+                                      'VALUES (?, ?, ?, ?)', (str(pmid), text, PENDING, self._clock()))
+            self._db.commit()
+        return cursor.rowcount == 1
+
+    def known(self, pmids):
+        """
+        INPUT : pmids - iterable of PMIDs
+        OUTPUT : set of the PMIDs (str) already in the queue, in any state
+        """
+        pmids = [str(pmid) for pmid in pmids]
+        known = set()
+        with self._lock:
+            for start in range(0, len(pmids), 500):  # below SQLite's limit of 999 parameters
+                chunk = pmids[start:start + 500]
+                known.update(pmid for pmid, in self._db.execute(
+                    f'SELECT pmid FROM queue WHERE pmid IN ({",".join("?" * len(chunk))})', chunk))
+        return known
+
+    def next_pending(self):
+        """
+        OUTPUT : (pmid(str), text(str)) of the oldest article waiting to be posted, or None
+                 Articles with fewer failed attempts go first, so one failing article does not hold up the others
+        """
+        with self._lock:
+            return self._db.execute('SELECT pmid, text FROM queue WHERE state = ? '
+                                    'ORDER BY attempts, discovered_at, rowid LIMIT 1', (PENDING,)).fetchone()
+
+    def mark_posted(self, pmid, status_id=None):
+        with self._lock:
+            self._db.execute('UPDATE queue SET state = ?, posted_at = ?, status_id = ? WHERE pmid = ?',
+                             (POSTED, self._clock(), None if status_id is None else str(status_id), str(pmid)))
+            self._db.commit()
+
+    def mark_failed(self, pmid, error):
+        """
+        Records a failed attempt; after max_attempts the article is given up on
+        """
+        with self._lock:
+            self._db.execute('UPDATE queue SET attempts = attempts + 1, last_error = ?, '
+                             'state = CASE WHEN attempts + 1 >= ? THEN ? ELSE state END WHERE pmid = ?',
+                             (str(error), self.max_attempts, FAILED, str(pmid)))
+            self._db.commit()
+
+    def last_posted_at(self):
+        """
+        OUTPUT : time (epoch seconds) of the last post, or None
+        """
+        with self._lock:
+            return self._db.execute('SELECT MAX(posted_at) FROM queue').fetchone()[0]
+
+    def counts(self):
+        """
+        OUTPUT : dict {state: number of articles}
+        """
+        with self._lock:
+            return dict(self._db.execute('SELECT state, COUNT(*) FROM queue GROUP BY state'))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def publish_next(publish_queue, post):
+    """
+    Posts the oldest pending article
+    INPUT :
+        publish_queue - PublishQueue
+        post - callable(pmid, text) that publishes the tweet and returns its status id
+    OUTPUT : True if it was posted, False if posting failed, None if the queue is empty
+    """
+    item = publish_queue.next_pending()
+    if item is None:
+        return None
+    pmid, text = item
+    try:
+        with metrics.span('publish'):
+            status_id = post(pmid, text)
+    except Exception as e:
+        log.error(e)
+        metrics.count('publish_total', outcome='failed')
+        publish_queue.mark_failed(pmid, e)
+        return False
+    metrics.count('publish_total', outcome='posted')
+    publish_queue.mark_posted(pmid, status_id)
+    return True
+
+
+def run_publisher(publish_queue, post, interval, stop_when_empty=True, sleep=time.sleep, clock=time.time,
+                  stop=None):
+    """
+    Drains the queue, posting one article every `interval` seconds
+    The cadence is measured from the last post recorded in the queue, so a restart does not
+    cause a burst of tweets. Posting is at-least-once: an article is only marked as posted
+    after `post` returns, so `post` must be idempotent (see pubmed.post_article)
+    INPUT :
+        publish_queue - PublishQueue
+        post - callable(pmid, text) returning the status id
+        interval(float) - seconds between two posts
+        stop_when_empty(bool) - return once nothing is left to post instead of waiting for new articles
+        stop - optional threading.Event: setting it interrupts the wait and returns (graceful shutdown)
+    OUTPUT : None
+    """
+    if stop is not None:
+        sleep = stop.wait
+    while stop is None or not stop.is_set():
+        last_posted_at = publish_queue.last_posted_at()
+        wait = 0 if last_posted_at is None else last_posted_at + interval - clock()
+        if wait > 0:
+            sleep(wait)
+            continue
+        posted = publish_next(publish_queue, post)
+        if posted is None and stop_when_empty:
+            return
+        if not posted:  # nothing to post yet, or a failed attempt to retry later
+            sleep(interval)
@@ -0,0 +1,201 @@
+import collections
+import itertools
+import threading
+import time
+
+import config
+import metrics
+
+# Twitter allows 300 tweets and retweets (combined) per account every 3 hours
+TWEET_LIMIT = 300
+TWEET_WINDOW = 3 * 60 * 60
+
+
+class BudgetStopped(Exception):
+    pass
+
+
+class RateBudget:
+    """
+    Sliding-window count of the calls made against a Twitter limit (`limit` calls every `window` seconds).
+    acquire() waits until the window has room, so the bot slows down instead of being rejected.
+    stop() cuts the waits short (they can last up to `window` seconds), so a shutdown never hangs on them.
+    """
+
+    def __init__(self, limit=TWEET_LIMIT, window=TWEET_WINDOW, clock=time.monotonic, sleep=None):
+        self.limit = limit
+        self.window = window
+        self._clock = clock
+        self._stopping = threading.Event()
+        self._sleep = sleep or self._stopping.wait
+        self._calls = collections.deque()
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        with self._lock:
+            self._expire(self._clock())
+            return self.limit - len(self._calls)
+
+    def _expire(self, now):
+        while self._calls and self._calls[0] <= now - self.window:
+            self._calls.popleft()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._expire(now)
+                if len(self._calls) < self.limit:
+                    self._calls.append(now)
+                    return
+                wait = self._calls[0] + self.window - now
+            if self._stopping.is_set():
+                raise BudgetStopped(f'Twitter rate budget stopped, next call possible in {wait:.0f} s')
+            metrics.observe('twitter_budget_wait_seconds', wait)
+            self._sleep(wait)
+
+    def stop(self):
+        """
+        Interrupts the current waits: from now on acquire() raises BudgetStopped instead of waiting
+        (calls that fit in the budget still go through)
+        """
+        self._stopping.set()
+
+
+class TweepyBackend:
+    """
+    Twitter backend built on one long-lived tweepy.API (a single authenticated, pooled HTTP session)
+    """
+
+    def __init__(self, ck, cs, at, ats):
+        import tweepy
+
+        auth = tweepy.OAuthHandler(ck, cs)
+        auth.set_access_token(at, ats)
+        self.api = tweepy.API(auth)
+
+    def account_id(self):
+        return self.api.verify_credentials().id
+
+    def update_status(self, text, in_reply_to_status_id=None):
+        if in_reply_to_status_id is None:
+            return self.api.update_status(status=text).id
+        return self.api.update_status(status=text, in_reply_to_status_id=in_reply_to_status_id,
+                                      auto_populate_reply_metadata=True).id
+
+    def retweet(self, status_id):
+        return self.api.retweet(status_id).id
+
+
+class FakeBackend:
+    """
+    In-memory Twitter backend used to run and benchmark the bots offline.
+    Every call is recorded in `calls`; `latency` seconds are spent per call to mimic a round trip.
+    """
+
+    def __init__(self, account_id=1, latency=0.0, sleep=time.sleep):
+        self._account_id = account_id
+        self.latency = latency
+        self._sleep = sleep
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.calls = []
+
+    def _call(self, *call):
+        if self.latency:
+            self._sleep(self.latency)
+        with self._lock:
+            self.calls.append(call)
+            return next(self._ids)
+
+    def account_id(self):
+        self._call('verify_credentials')
+        return self._account_id
+
+    def update_status(self, text, in_reply_to_status_id=None):
+        return self._call('update_status', text, in_reply_to_status_id)
+
+    def retweet(self, status_id):
+        return self._call('retweet', status_id)
+
+
+class Publisher:
+    """
+    Shared Twitter client for the three bots.
+    The account id is looked up once when the publisher is created, and every tweet and
+    retweet goes through the same RateBudget.
+    """
+
+    def __init__(self, backend, budget=None):
+        self.backend = backend
+        self.budget = budget or RateBudget()
+        self.account_id = backend.account_id()
+        self.counts = collections.Counter()
+        self._lock = threading.Lock()  # posts and retweets come from several threads
+
+    def post(self, text, in_reply_to_status_id=None):
+        """
+        INPUT : text(str), in_reply_to_status_id - id of the tweet to reply to (optional)
+        OUTPUT : id of the new tweet
+        """
+        self.budget.acquire()
+        status_id = self._call('post', self.backend.update_status, text, in_reply_to_status_id)
+        self._count('post')
+        return status_id
+
+    def post_thread(self, texts):
+        """
+        Posts texts as a thread, each tweet replying to the previous one
+        INPUT : texts - list of str
+        OUTPUT : list of tweet ids
+        """
+        status_ids = []
+        for text in texts:
+            status_ids.append(self.post(text, status_ids[-1] if status_ids else None))
+        return status_ids
+
+    def retweet(self, status_id):
+        self.budget.acquire()
+        retweet_id = self._call('retweet', self.backend.retweet, status_id)
+        self._count('retweet')
+        return retweet_id
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    @staticmethod
+    def _call(action, function, *args):
+        """
+        Times one Twitter call and counts it by HTTP status (twitter_requests_total{action, code})
+        """
+        try:
+            with metrics.timed('twitter_request', action=action):
+                result = function(*args)
+        except Exception as e:
+            response = getattr(e, 'response', None)
+            metrics.count('twitter_requests_total', action=action, code=getattr(response, 'status_code', 'error'))
+            raise
+        metrics.count('twitter_requests_total', action=action, code=200)
+        return result
+
+    def is_own(self, status):
+        """
+        OUTPUT : True if the status was tweeted by the bot's own account
+        """
+        return status.user.id == self.account_id
+
+
+_publisher = None
+
+
+def get_publisher():
+    """
+    Returns the process-wide Publisher, authenticating with the keys in config.py the first time
+    OUTPUT : Publisher
+    """
+    global _publisher
+    if _publisher is None:
+        _publisher = Publisher(TweepyBackend(config.api_key, config.api_key_secret, config.access_token,
+                                             config.access_token_secret))
+    return _publisher
@@ -1,103 +1,227 @@
-import time
+import datetime
+import json
+import logging
+import os
 import re
 import config
+import metrics
+from ratelimit import RateLimiter
+from pmid_store import open_store
+from publish_queue import PublishQueue, run_publisher
+from publisher import get_publisher
+from query_builder import build_query
+from summary_store import open_summary_store
+from storage import atomic_write
 
 
+log = logging.getLogger(__name__)
+
 # This code is an adaptation of Maxime Borry's code - available on github.com/maxibor/PubTwitMed
 
-def pubmed_search(search_term, nb_max_articles):
+# Geriatrics search strategy, compiled by query_builder into
+# ((population) NOT (excluded)) OR ((population) AND (review designs)).
+# Terms are kept exactly as they were sent in the original one-line query
+GERIATRIC_POPULATION_TERMS = ["elderly[ti]", "old age[ti]", "aging[ti]", "geriatric[ti]", "60 years[ti]",
+                              "65 years[ti]", "70 years[ti]", "75 years[ti]", "80 years[ti]", "85 years[ti]",
+                              "90 years[ti]", "95 years[ti]", "100 years[ti]", "octogenarian*[ti]",
+                              "nonagenarian*[ti]", "older[ti]", "longevity[ti]", "parkinson's[ti]",
+                              "dementia[ti]", "delirium[ti]"]
+EXCLUDED_TERMS = ["correction[ti]", "pediatric[ti]", "paediatric[ti]", "protocol[ti]", "comment[ti]",
+                  "editorial[pt]", "review[pt]", "Published Erratum[pt]", "rat[ti]", "anopheles[ti]", "egg*[ti]",
+                  "primate*[ti]", "fish[ti]", "catfish[ti]", "zebrafish[ti]", "rodent[ti]", "rats[ti]",
+                  "mouse[ti]", "mice[ti]", "soil[ti]", "vortexmatter[ti]", "vortex matter[ti]"]
+REVIEW_DESIGN_TERMS = ["systematic review", "meta analysis", "meta analyses", "systematic search[All fields]"]
+
+GERIATRIC_QUERY = build_query(GERIATRIC_POPULATION_TERMS, EXCLUDED_TERMS, REVIEW_DESIGN_TERMS)
+
+
+# NCBI E-utilities allow 3 requests per second without an API key and 10 with one
+NCBI_RATE_WITHOUT_KEY = 3
+NCBI_RATE_WITH_KEY = 10
+
+# ESearch cannot page (retstart) past this many records of one search
+ESEARCH_MAX_RECORDS = 9999
+
+_entrez_limiter = None
+
+
+def entrez_limiter():
     '''
-    Search Pubmed for the nb_max_articles most recent articles on the
-    search_term subject.
-    INPUT : Search Term(str) and nb_max_articles(int)
-    OUPUT : Dictionnary of Lists ['PMID':['Title','First Author','PubDate']]
+    Returns the process-wide rate limiter for Entrez calls, sized according to
+    whether config.pubmed_api_key is set
+    INPUT : None
+    OUTPUT : RateLimiter
+    '''
+    global _entrez_limiter
+    if _entrez_limiter is None:
+        rate = NCBI_RATE_WITH_KEY if config.pubmed_api_key else NCBI_RATE_WITHOUT_KEY
+        _entrez_limiter = RateLimiter(rate)
+    return _entrez_limiter
+
+
+def entrez_call(endpoint, **params):
     '''
+    One rate limited request to the PubMed E-utilities, timed (entrez_request_seconds) and
+    counted by endpoint and HTTP status (entrez_requests_total)
+    INPUT : endpoint(str) - 'esearch' or 'esummary', params - passed to Bio.Entrez
+    OUTPUT : parsed record
+    '''
+    from urllib.error import HTTPError
     from Bio import Entrez
 
-    article_dictionary = {}
     Entrez.email = config.pubmed_email  # You can set up an API key with your ncbi account on www.ncbi.nlm.nih.gov
     Entrez.api_key = config.pubmed_api_key
-    max_number_of_articles = nb_max_articles
-
-    myhandle = Entrez.esearch(db="pubmed", term=search_term,
-                              retmax=max_number_of_articles)
-    my_record = Entrez.read(myhandle)
-    my_list = my_record["IdList"]
-    for article in range(0, len(my_list)):
-        listId = my_list[article]
-        my_secondary_handle = Entrez.esummary(db="pubmed", id=listId)
-        my_record = Entrez.read(my_secondary_handle)
-        one_article = my_record[0]
-        try:
-            article_dictionary[one_article["Id"]] = [re.sub(re.compile('<.*?>'), '', one_article["Title"]),
-                                                     one_article["AuthorList"], one_article["PubDate"]]
-        except:
-            continue
-        time.sleep(0.5)
-        # break
+    entrez_limiter().acquire()
+    try:
+        with metrics.timed('entrez_request', endpoint=endpoint):
+            record = Entrez.read(getattr(Entrez, endpoint)(db="pubmed", **params))
+    except HTTPError as e:
+        metrics.count('entrez_requests_total', endpoint=endpoint, code=e.code)
+        raise
+    metrics.count('entrez_requests_total', endpoint=endpoint, code=200)
+    return record
+
+
+def summary_to_entry(one_article):
+    '''
+    Turns one ESummary record into the [Title, Authors, PubDate] list used by the bot
+    INPUT : one_article - a 'Bio.Entrez.Parser.DictionaryElement'
+    OUTPUT : ['Title','Authors','PubDate'](list)
+    '''
+    return [re.sub(re.compile('<.*?>'), '', one_article["Title"]),
+            one_article["AuthorList"], one_article["PubDate"]]
+
+
+def pubmed_search(search_term, nb_max_articles, batch_size=200):
+    '''
+    Search Pubmed for the nb_max_articles most recent articles on the
+    search_term subject.
+    The search is kept on the Entrez history server (WebEnv/query_key) and the
+    summaries are retrieved batch_size articles per request and saved in the summary store.
+    INPUT : Search Term(str), nb_max_articles(int) and batch_size(int)
+    OUPUT : Dictionnary of Lists ['PMID':['Title','First Author','PubDate']]
+    '''
+    article_dictionary = {}
+    my_record = entrez_call("esearch", term=search_term, retmax=nb_max_articles, usehistory="y")
+    nb_found = len(my_record["IdList"])
+
+    summary_store = open_summary_store(config.pubmed_summaries_path)
+    for retstart in range(0, nb_found, batch_size):
+        my_summaries = entrez_call("esummary", webenv=my_record["WebEnv"], query_key=my_record["QueryKey"],
+                                   retstart=retstart, retmax=min(batch_size, nb_found - retstart))
+        summary_store.put_many(my_summaries)  # kept for the weekly thread (see pubmed_search_individual)
+        for one_article in my_summaries:
+            try:
+                article_dictionary[one_article["Id"]] = summary_to_entry(one_article)
+            except KeyError:
+                continue
     return article_dictionary
 
 
-def pmid_tool(pmid, pmid_db):
+def fetch_summaries(pmids, batch_size=200):
+    '''
+    Retrieves the ESummary records of a list of PMIDs, batch_size PMIDs per request
+    INPUT : pmids - list of PMIDs, batch_size(int)
+    OUTPUT : list of 'Bio.Entrez.Parser.DictionaryElement'
     '''
-    Gets a PMID in input, and check if it already in pmid_db.txt file.
-    If yes returns "already", if not appends it to pmid_db.txt and returns the
-    direct link to the publication
+    records = []
+    pmids = [str(pmid) for pmid in pmids]
+    for start in range(0, len(pmids), batch_size):
+        records.extend(entrez_call("esummary", id=",".join(pmids[start:start + batch_size])))
+    return records
+
+
+def esearch_window(search_term, mindate, maxdate, page_size=1000):
+    '''
+    PMIDs of the articles on the search_term subject added (Entrez date) from mindate to maxdate
+    (both included), paged through with retstart. ESearch cannot page past ESEARCH_MAX_RECORDS
+    records, so a larger window (e.g. after a long outage) is split in two by date until it fits
+    INPUT : search_term(str), mindate, maxdate(datetime.date), page_size(int)
+    OUTPUT : list of PMIDs(str)
+    '''
+    pmids, retstart, count = [], 0, 1
+    while retstart < count:
+        my_record = entrez_call("esearch", term=search_term, datetype="edat", mindate=mindate.strftime("%Y/%m/%d"),
+                                maxdate=maxdate.strftime("%Y/%m/%d"), retstart=retstart,
+                                retmax=min(page_size, ESEARCH_MAX_RECORDS - retstart))
+        count = int(my_record["Count"])
+        if count > ESEARCH_MAX_RECORDS:
+            if mindate < maxdate:
+                middle = mindate + (maxdate - mindate) // 2
+                return (esearch_window(search_term, mindate, middle, page_size) +
+                        esearch_window(search_term, middle + datetime.timedelta(days=1), maxdate, page_size))
+            log.warning('%s articles added on %s, only the first %s are searched', count, mindate,
+                        ESEARCH_MAX_RECORDS)
+            count = ESEARCH_MAX_RECORDS
+        if not my_record["IdList"]:
+            break
+        pmids.extend(my_record["IdList"])
+        retstart += len(my_record["IdList"])
+    return pmids
+
+
+def pubmed_search_incremental(search_term, state_file, pmid_db, publish_queue=None, page_size=1000,
+                              batch_size=200, initial_days=7):
+    '''
+    Search Pubmed for the articles on the search_term subject added (Entrez date) since the last
+    successful sweep, whose date is kept in state_file. PMIDs already in pmid_db (posted) or in
+    publish_queue (queued, in any state) are skipped before any summary is fetched. The date is
+    not saved here: the caller saves the returned date with save_sweep_state once the articles
+    are safely queued, so a crash in between repeats the window instead of skipping it.
+    The window starts on the day of the last sweep (inclusive), so articles indexed later that
+    day are not missed; the first sweep covers the last initial_days days
     INPUT :
-    PMID_identifier (string)
-    pmid_db(str): Path to pmid_db.txt file
-    OUTPUT : PMID url
-    EXAMPLE : pmid_tool ("35633251")
-    '''
-
-    def pmid_url_resolver(pmid):
-        '''
-        Gets a PMID in input and uses the dx.doi.org service to
-        return article url
-        INPUT : PMID(str)
-        OUTPUT : PMID URL(str)
-        EXAMPLE : pmid ("35633251")
-        '''
-        return "http://pubmed.ncbi.nlm.nih.gov/" + str(pmid)
-
-    def pmid_checker(pmid_string, pmid_db):
-        '''
-        Gets a PMID in input, and check if it already in pmid_db.txt file.
-        If yes, returns TRUE, if not, returns FALSE and DOI
-        INPUT :
-            PMID(str)
-            pmid_db(str): Path to pmid_db.txt file
-        OUTPUT : True/False(Bool)
-        EXAMPLE : pmid_checker("35633251")
-        '''
-        pmid_list = []
-        with open(pmid_db, "r") as pmid_db:
-            for line in pmid_db:
-                line = line.rstrip()
-                pmid_list.append(line)
-        if pmid_string in pmid_list:
-            return True, "NA"
-        elif pmid_string not in pmid_list:
-            pmid_list.append(pmid_string)
-            return False, pmid_string
-
-    def pmid_appender(pmid_string, pmid_db):
-        '''
-        Appends PMID in pmid_db.txt
-        INPUT :
-            PMID(str)
-            pmid_db(str): Path to PMID.txt file
-        OUTPUT : None
-        EXAMPLE : pmid_appender("35633251")
-        '''
-        with open(pmid_db, "a") as pmid_db:
-            pmid_db.write(pmid_string + "\n")
-
-    if not pmid_checker(pmid, pmid_db)[0]:
-        pmid_appender(pmid_checker(pmid, pmid_db)[1], pmid_db)
-        return pmid_url_resolver(pmid)
+        search_term(str)
+        state_file(str): Path to the JSON file holding the last sweep date
+        pmid_db(str): Path to pmid_db.txt file
+        publish_queue: PublishQueue (optional)
+        page_size(int), batch_size(int), initial_days(int)
+    OUPUT : (Dictionnary of Lists ['PMID':['Title','First Author','PubDate']], date of this sweep(str))
+    '''
+    today = datetime.date.today()
+    state = {}
+    if os.path.exists(state_file):
+        with open(state_file) as state_json:
+            state = json.load(state_json)
+    if state.get("last_edat"):
+        mindate = datetime.datetime.strptime(state["last_edat"], "%Y/%m/%d").date()
     else:
-        return "already"
+        mindate = today - datetime.timedelta(days=initial_days)
+
+    pmids = open_store(pmid_db).filter_new(esearch_window(search_term, mindate, today, page_size))
+    if publish_queue is not None:
+        queued = publish_queue.known(pmids)
+        pmids = [pmid for pmid in pmids if pmid not in queued]
+    article_dictionary = {}
+    my_summaries = fetch_summaries(pmids, batch_size)
+    open_summary_store(config.pubmed_summaries_path).put_many(my_summaries)
+    for one_article in my_summaries:
+        try:
+            article_dictionary[one_article["Id"]] = summary_to_entry(one_article)
+        except KeyError:
+            continue
+    return article_dictionary, today.strftime("%Y/%m/%d")
+
+
+def save_sweep_state(state_file, last_edat):
+    '''
+    Records the Entrez date of the last successful sweep, where the next incremental sweep starts
+    INPUT : state_file(str), last_edat(str) - date returned by pubmed_search_incremental
+    OUTPUT : None
+    '''
+    with atomic_write(state_file) as state_json:
+        json.dump({"last_edat": last_edat}, state_json)
+
+
+def pmid_url_resolver(pmid):
+    '''
+    Gets a PMID in input and uses the dx.doi.org service to
+    return article url
+    INPUT : PMID(str)
+    OUTPUT : PMID URL(str)
+    EXAMPLE : pmid ("35633251")
+    '''
+    return "http://pubmed.ncbi.nlm.nih.gov/" + str(pmid)
 
 
 def string_shortener(string_to_shorten, max_size):
@@ -114,55 +238,88 @@ def string_shortener(string_to_shorten, max_size):
     return string_to_shorten
 
 
-def twitterbot(string_to_tweet, ck, cs, at, ats):
+def compose_tweet(pmid, article):
     '''
-    Publish on twitter the string_to_tweet
+    Builds the tweet of one article: title (shortened to fit), #geripapers and the PubMed link
     INPUT :
-        string_to_tweet(str): text to tweet
-        ck(str): Twitter consumer key
-        cs(str): Twitter consumer secret
-        at(str): Twitter access token
-        ats(str): Twitter access token secret
-    OUTPUT : None
+        pmid(str)
+        article(list): ['Title','Authors','PubDate'] as returned by pubmed_search
+    OUTPUT : text to tweet(str)
+    '''
+    hashtag = f'#geripapers'  # Includes the #geripapers hashtag in each tweet
+    almost_to_tweet = " " + hashtag + " " + pmid_url_resolver(pmid)
+    max_title_len = 280 - len(almost_to_tweet)
+    final_title = string_shortener(article[0].encode("utf-8").decode("utf-8"), max_title_len)
+    return final_title + almost_to_tweet
+
+
+def discover_articles(search_term, nb_max_articles, pmid_db, publish_queue, state_file=None):
+    '''
+    Searches PubMed and queues every article that has not been tweeted yet
+    INPUT :
+        search_term(str), nb_max_articles(int)
+        pmid_db(str): Path to pmid_db.txt file (PMIDs already tweeted)
+        publish_queue: PublishQueue
+        state_file(str): if given, only the articles added since the last sweep are searched
+                         (see pubmed_search_incremental) and nb_max_articles is not used
+    OUTPUT : number of articles added to the queue(int)
+    '''
+    with metrics.span('pubmed_search', incremental=state_file is not None):
+        if state_file is None:
+            gerisearch = pubmed_search(search_term, nb_max_articles)
+        else:
+            gerisearch, last_edat = pubmed_search_incremental(search_term, state_file, pmid_db, publish_queue)
+    new_articles = open_store(pmid_db).filter_new(gerisearch)  # drops every PMID tweeted before
+    queued = 0
+    for article in new_articles:
+        text_to_tweet = compose_tweet(article, gerisearch[article])
+        if publish_queue.enqueue(article, text_to_tweet):
+            queued += 1
+            log.info("PMID :  %s", article)
+            log.info("Title :  %s", gerisearch[article][0].encode("utf-8").decode("utf-8"))
+            log.info("Authors :  %s", gerisearch[article][1])
+            log.info("PubDate :  %s", gerisearch[article][2])
+            log.info(text_to_tweet)
+            log.info("tweet length : %s", len(text_to_tweet))
+            log.info("= = = = = = = = = = =")
+    metrics.count('pubmed_articles_queued_total', queued)
+    if state_file is not None:
+        save_sweep_state(state_file, last_edat)  # only now that every article is in the queue
+    return queued
+
+
+def post_article(pmid, text_to_tweet, pmid_db):
+    '''
+    Tweets a queued article and records its PMID in pmid_db.txt
+    Safe to call again for the same article: PMIDs already in pmid_db.txt are not tweeted
+    again, and a tweet rejected by Twitter as a duplicate counts as posted
+    INPUT :
+        pmid(str), text_to_tweet(str)
+        pmid_db(str): Path to pmid_db.txt file
+    OUTPUT : status id of the tweet, or None if it had already been posted
     '''
     import tweepy
-    login = tweepy.OAuthHandler(ck, cs)
-    login.set_access_token(at, ats)
-    this_api = tweepy.API(login)
-    res = this_api.update_status(status=string_to_tweet)
-    return res
+
+    if pmid in open_store(pmid_db):
+        return None
+    try:
+        status_id = get_publisher().post(text_to_tweet)
+    except tweepy.errors.Forbidden as e:
+        if 187 not in e.api_codes:  # 187: Status is a duplicate
+            raise
+        status_id = None
+    open_store(pmid_db).add(pmid)
+    return status_id
 
 
 if __name__ == '__main__':
-    # Be wary when creating a search query for the BioPython "Entrez.esearch"
-    # Tried to split the query line into multiple components but
-    # it retrieves different results from setting up in one long line
-    query = "((elderly[ti] OR ""old age""[ti] OR aging[ti] OR geriatric[ti] OR ""60 years""[ti] OR ""65 years""[ti] OR ""70 years""[ti] OR ""75 years""[ti] OR ""80 years""[ti] OR ""85 years""[ti] OR ""90 years""[ti] OR ""95 years""[ti] OR ""100 years""[ti] OR octogenarian*[ti] OR nonagenarian*[ti] OR older[ti] OR longevity[ti] OR ""parkinson's""[ti] OR dementia[ti] OR delirium[ti]) NOT (correction[ti] OR pediatric[ti] OR paediatric[ti] OR protocol[ti] OR comment[ti] OR editorial[pt] OR review[pt] OR Published Erratum[pt] OR rat[ti] OR anopheles[ti] OR egg*[ti] OR primate*[ti] OR fish[ti] OR catfish[ti] OR zebrafish[ti] rodent[ti] OR rats[ti] OR mouse[ti] OR mice[ti] OR soil[ti] OR vortexmatter[ti] OR ""vortex matter""[ti])) OR ((elderly[ti] OR ""old age""[ti] OR aging[ti] OR geriatric[ti] OR ""60 years""[ti] OR ""65 years""[ti] OR ""70 years""[ti] OR ""75 years""[ti] OR ""80 years""[ti] OR ""85 years""[ti] OR ""90 years""[ti] OR ""95 years""[ti] OR ""100 years""[ti] OR octogenarian*[ti] OR nonagenarian*[ti] OR older[ti] OR longevity[ti] OR ""parkinson's""[ti] OR dementia[ti] OR delirium[ti]) AND (""systematic review"" OR ""meta analysis"" OR ""meta analyses"" OR ""systematic search""[All fields]))"
-    gerisearch = pubmed_search(query, 300)
-
-    for article in gerisearch:
-        unique_identifier = pmid_tool(article, "pmid_db.txt")
-        if unique_identifier != "already":
-            print(unique_identifier)
-            print("PMID : ", article)
-            print("URL : ", unique_identifier)
-            print("Title : ", gerisearch[article][0].encode("utf-8").decode("utf-8"))
-            print("Authors : ", gerisearch[article][1])
-            print("PubDate : ", gerisearch[article][2])
-            final_url = unique_identifier
-            hashtag = f'#geripapers'  # Includes the #geripapers hashtag in each tweet
-            try:
-                almost_to_tweet = " " + hashtag + " " + final_url
-                max_title_len = 280 - len(almost_to_tweet)
-                final_title = string_shortener(
-                    gerisearch[article][0].encode("utf-8").decode("utf-8"), max_title_len)
-                text_to_tweet = final_title + almost_to_tweet
-                print(text_to_tweet)
-                print("tweet length :", len(text_to_tweet))
-                print("= = = = = = = = = = =")
-                twitterbot(text_to_tweet, config.api_key, config.api_key_secret, config.access_token,
-                           config.access_token_secret)
-                time.sleep(1200)  # 1200 seconds equals 20 minutes
-            except Exception as e:
-                print(e)
-                continue
+    with metrics.run('pubmed'):
+        query = GERIATRIC_QUERY
+        publish_queue = PublishQueue(config.publish_queue_path)
+
+        # Discovery runs at full speed, new articles wait in the queue until they are published
+        discover_articles(query, 300, "pmid_db.txt", publish_queue, state_file=config.pubmed_state_path)
+
+        # One tweet every config.publish_interval seconds (1200 seconds equals 20 minutes)
+        run_publisher(publish_queue, lambda pmid, text: post_article(pmid, text, "pmid_db.txt"),
+                      config.publish_interval)
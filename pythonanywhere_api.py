@@ -1,3 +1,5 @@
+# Restarts the always-on pubmed.py task (id 58864) so its search runs again every day.
+# Not needed when the bots run as a single geripapers_service.py task, which schedules the daily sweep itself.
 import requests
 import config
 
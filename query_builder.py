@@ -0,0 +1,295 @@
+import re
+
+OPERATORS = ('AND', 'OR', 'NOT')
+
+# Terms with these field tags are checked against the publication types, every other term against the title
+PUBLICATION_TYPE_FIELDS = ('pt',)
+
+TOKEN_RE = re.compile(r'\s*(?:(?P<paren>[()])|"(?P<phrase>[^"]*)"(?:\[(?P<phrase_field>[^\]]+)\])?'
+                      r'|(?P<word>[^\s()"\[\]]+)(?:\[(?P<word_field>[^\]]+)\])?)')
+
+
+class QueryError(ValueError):
+    pass
+
+
+class Term:
+    """
+    One search term, e.g. octogenarian*[ti]: text, optional field tag and whether it was quoted
+    """
+
+    def __init__(self, text, field=None, quoted=False):
+        self.text = text
+        self.field = field
+        self.quoted = quoted
+
+    def key(self):
+        return self.text.lower(), (self.field or '').lower()
+
+    def __repr__(self):
+        return f'Term({self.text!r}, {self.field!r})'
+
+
+class BooleanNode:
+    """
+    Boolean operator (AND/OR/NOT) applied left to right to its children, as PubMed does
+    """
+
+    def __init__(self, operator, children):
+        self.operator = operator
+        self.children = children
+
+    def __repr__(self):
+        return f'BooleanNode({self.operator!r}, {self.children!r})'
+
+
+def tokenize(query):
+    """
+    Splits an Entrez query into '(' / ')' / operators and Term objects
+    Consecutive untagged words are joined into one phrase ending at the first tagged word,
+    so old age[ti] is the term 'old age' in [ti]
+    INPUT : query(str)
+    OUTPUT : list of tokens
+    """
+    tokens, words, position = [], [], 0
+    query = query.rstrip()
+
+    def flush_words(field=None):
+        if words:
+            tokens.append(Term(' '.join(words), field))
+            words.clear()
+
+    while position < len(query):
+        match = TOKEN_RE.match(query, position)
+        if match is None or match.end() == position:
+            raise QueryError(f'Unexpected character at position {position}: {query[position:position + 20]!r}')
+        position = match.end()
+        if match.group('paren'):
+            flush_words()
+            tokens.append(match.group('paren'))
+        elif match.group('phrase') is not None:
+            flush_words()
+            tokens.append(Term(match.group('phrase'), match.group('phrase_field'), quoted=True))
+        elif match.group('word') in OPERATORS:
+            flush_words()
+            tokens.append(match.group('word'))
+        else:
+            words.append(match.group('word'))
+            if match.group('word_field'):
+                flush_words(match.group('word_field'))
+    flush_words()
+    return tokens
+
+
+def parse(query, strict=True):
+    """
+    Parses an Entrez boolean query into a tree of BooleanNode/Term
+    Two terms without an operator between them are an error when strict, otherwise
+    they are joined with AND (what PubMed does) and reported by validate()
+    INPUT : query(str), strict(bool)
+    OUTPUT : BooleanNode or Term
+    """
+    tokens = tokenize(query)
+    problems = []
+    position = 0
+
+    def parse_operand():
+        nonlocal position
+        if position >= len(tokens):
+            raise QueryError('Query ends where a term was expected')
+        token = tokens[position]
+        position += 1
+        if token == '(':
+            node = parse_sequence()
+            if position >= len(tokens) or tokens[position] != ')':
+                raise QueryError('Missing closing parenthesis')
+            position += 1
+            return node
+        if isinstance(token, Term):
+            return token
+        raise QueryError(f'Unexpected {token!r} where a term was expected')
+
+    def parse_sequence():
+        nonlocal position
+        node = parse_operand()
+        while position < len(tokens) and tokens[position] != ')':
+            token = tokens[position]
+            if token in OPERATORS:
+                position += 1
+                operator = token
+            else:
+                operator = 'AND'
+                problems.append(f'Missing operator before {describe(token)}')
+            right = parse_operand()
+            if isinstance(node, BooleanNode) and node.operator == operator:
+                node.children.append(right)
+            else:
+                node = BooleanNode(operator, [node, right])
+        return node
+
+    tree = parse_sequence()
+    if position < len(tokens):
+        raise QueryError('Unbalanced closing parenthesis')
+    if problems and strict:
+        raise QueryError('; '.join(problems))
+    tree.problems = problems
+    return tree
+
+
+def describe(token):
+    return to_entrez(token) if isinstance(token, Term) else repr(token)
+
+
+def validate(query):
+    """
+    INPUT : query(str)
+    OUTPUT : list of problems (str) found in the query, empty if it is valid
+    """
+    try:
+        return parse(query, strict=False).problems
+    except QueryError as e:
+        return [str(e)]
+
+
+def to_entrez(node):
+    """
+    Compiles a parsed query back into an Entrez query string
+    Terms are written the way they were given (quoted or not), only spacing is normalised
+    INPUT : node - BooleanNode or Term
+    OUTPUT : query(str)
+    """
+    if isinstance(node, Term):
+        text = f'"{node.text}"' if node.quoted else node.text
+        return f'{text}[{node.field}]' if node.field else text
+    parts = []
+    for child in node.children:
+        part = to_entrez(child)
+        parts.append(f'({part})' if isinstance(child, BooleanNode) else part)
+    return f' {node.operator} '.join(parts)
+
+
+def build_query(population, exclude, designs):
+    """
+    Compiles the search strategy term lists into one Entrez query:
+    ((population) NOT (exclude)) OR ((population) AND (designs))
+    INPUT : population, exclude, designs - lists of terms, e.g. ['elderly[ti]', 'old age[ti]']
+    OUTPUT : query(str)
+    """
+    groups = []
+    for terms in (population, exclude, designs):
+        for term in terms:
+            if not isinstance(parse(term), Term):
+                raise QueryError(f'{term!r} is not a single search term')
+        groups.append(' OR '.join(terms))
+    query = f'(({groups[0]}) NOT ({groups[1]})) OR (({groups[0]}) AND ({groups[2]}))'
+    parse(query)
+    return query
+
+
+WORD_RE = re.compile(r"[\w']+")
+
+
+def title_words(text):
+    """
+    Splits a title (or a term) into lowercase words; hyphens and punctuation separate words
+    INPUT : text(str)
+    OUTPUT : list of words (str)
+    """
+    return WORD_RE.findall(text.lower().replace('\u2019', "'"))
+
+
+class TitleMatcher:
+    """
+    Local version of a parsed query, to re-filter cached PubMed summaries without calling Entrez.
+    The terms are compiled once into a word-level lookup table (phrases indexed by their first word,
+    truncated terms* by first letter), so a single pass over the words of a title finds every term it
+    contains, and the boolean tree is compiled into bitmask tests. [pt] terms are checked against
+    the publication types; terms with other field tags are approximated on the title.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self._bits = {}
+        self._phrases = {}
+        self._truncated = {}
+        self._pub_types = {}
+        self._collect(tree)
+        self._test = self._compile(tree)
+
+    def _collect(self, node):
+        if isinstance(node, BooleanNode):
+            for child in node.children:
+                self._collect(child)
+            return
+        if node.key() in self._bits:
+            return
+        bit = 1 << len(self._bits)
+        self._bits[node.key()] = bit
+        if (node.field or '').lower() in PUBLICATION_TYPE_FIELDS:
+            self._pub_types[node.text.lower()] = self._pub_types.get(node.text.lower(), 0) | bit
+            return
+        words = title_words(node.text)
+        if node.text.endswith('*'):
+            self._truncated.setdefault(words[0][0], []).append((tuple(words[:-1]), words[-1], bit))
+        else:
+            self._phrases.setdefault(words[0], []).append((tuple(words[1:]), bit))
+
+    def _compile(self, node):
+        if isinstance(node, Term):
+            bit = self._bits[node.key()]
+            return lambda found: found & bit
+        leaves = 0
+        tests = []
+        for child in node.children[1:] if node.operator == 'NOT' else node.children:
+            if isinstance(child, Term):
+                leaves |= self._bits[child.key()]
+            else:
+                tests.append(self._compile(child))
+        if node.operator == 'OR':
+            return lambda found: found & leaves or any(test(found) for test in tests)
+        if node.operator == 'AND':
+            return lambda found: found & leaves == leaves and all(test(found) for test in tests)
+        first = self._compile(node.children[0])
+        return lambda found: first(found) and not found & leaves and not any(test(found) for test in tests)
+
+    def matched_terms(self, title, pub_types=()):
+        """
+        INPUT : title(str), pub_types - list of publication types
+        OUTPUT : bitmask (int) of the terms found, one bit per distinct term
+        """
+        found = 0
+        words = title_words(title)
+        for position, word in enumerate(words):
+            for rest, bit in self._phrases.get(word, ()):
+                if not rest or tuple(words[position + 1:position + 1 + len(rest)]) == rest:
+                    found |= bit
+            for head, prefix, bit in self._truncated.get(word[0], ()):
+                end = position + len(head)
+                if end < len(words) and words[end].startswith(prefix) and tuple(words[position:end]) == head:
+                    found |= bit
+        for pub_type in pub_types:
+            found |= self._pub_types.get(pub_type.lower(), 0)
+        return found
+
+    def __call__(self, title, pub_types=()):
+        """
+        INPUT : title(str), pub_types - list of publication types
+        OUTPUT : True if the article matches the query
+        """
+        return bool(self._test(self.matched_terms(title, pub_types)))
+
+    def filter_articles(self, article_dictionary):
+        """
+        Re-filters articles already retrieved from PubMed with the local query
+        INPUT : article_dictionary - {PMID: ['Title','Authors','PubDate']} as returned by pubmed_search
+        OUTPUT : dict with the matching articles only
+        """
+        return {pmid: article for pmid, article in article_dictionary.items() if self(article[0])}
+
+
+def compile_matcher(query):
+    """
+    INPUT : query(str) - Entrez query
+    OUTPUT : TitleMatcher
+    """
+    return TitleMatcher(parse(query))
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+# Altmetric percentiles used to normalise the score within the paper's journal or age group
+NORMALIZATIONS = {
+    'journal': 'context.journal.pct',
+    'age': 'context.similar_age_3m.pct',
+    'age_journal': 'context.similar_age_journal_3m.pct',
+}
+
+
+def ranking_frame(altmetric_df, normalize=None, tie_break='first'):
+    """
+    Builds the small typed frame the ranking runs on, indexed by PMID
+    INPUT :
+        altmetric_df - pd.df with at least 'pmid' and 'score' columns (e.g. from altmetric_search)
+        normalize - None, or a key of NORMALIZATIONS to rank on that percentile instead of the raw score
+        tie_break - 'first' (earliest row wins, the order PMIDs were tweeted), 'pmid' (lowest PMID wins)
+                    or the name of a numeric column where the higher value wins
+    OUTPUT : pd.df indexed by PMID (str) with float 'key' and 'tie' columns (higher is better)
+    """
+    if normalize is None:
+        key = altmetric_df['score']
+    else:
+        column = NORMALIZATIONS[normalize]
+        key = altmetric_df[column] if column in altmetric_df else pd.Series(np.nan, index=altmetric_df.index)
+    if tie_break == 'first':
+        tie = -np.arange(len(altmetric_df), dtype='float64')
+    elif tie_break == 'pmid':
+        tie = -pd.to_numeric(altmetric_df['pmid'], errors='coerce').to_numpy(dtype='float64', na_value=np.inf)
+    else:
+        tie = pd.to_numeric(altmetric_df[tie_break], errors='coerce').to_numpy(dtype='float64', na_value=-np.inf)
+    return pd.DataFrame({'key': pd.to_numeric(key, errors='coerce').to_numpy(dtype='float64', na_value=np.nan),
+                         'tie': tie},
+                        index=pd.Index(altmetric_df['pmid'].astype(str), name='pmid'))
+
+
+def top_altmetric_papers(altmetric_df, k=1, exclude=(), normalize=None, tie_break='first'):
+    """
+    Returns the k best papers of altmetric_df that are not in exclude, best first
+    Uses a partial sort (np.partition) so only the top candidates get sorted; ties are broken by
+    tie_break and every remaining tie by row order, so the result is deterministic.
+    Papers without a score (or without the percentile when normalizing) are never selected
+    INPUT :
+        altmetric_df - pd.df with at least 'pmid' and 'score' columns (e.g. from altmetric_search)
+        k(int) - number of papers to return
+        exclude - iterable of PMIDs that were already selected
+        normalize, tie_break - see ranking_frame
+    OUTPUT : pd.df with the selected rows of altmetric_df (all columns)
+    """
+    ranked = ranking_frame(altmetric_df, normalize, tie_break)
+    key = ranked['key'].to_numpy()
+    tie = ranked['tie'].to_numpy()
+    candidates = np.flatnonzero(~np.isnan(key) & ~ranked.index.isin([str(pmid) for pmid in exclude]))
+
+    # Keep only the candidates at or above the k-th best key (partial sort), then sort that handful
+    if 0 < k < len(candidates):
+        kth = len(candidates) - k
+        threshold = np.partition(key[candidates], kth)[kth]
+        candidates = candidates[key[candidates] >= threshold]
+    best = candidates[np.lexsort((candidates, -tie[candidates], -key[candidates]))[:k]]
+    return altmetric_df.iloc[best]
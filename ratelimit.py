@@ -0,0 +1,38 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket that allows `rate` calls per second, with bursts of up to `capacity` calls.
+    It is thread-safe, so a single limiter can be shared by every worker calling the same API.
+    clock and sleep can be swapped (e.g. for a virtual clock) when timing the bots offline;
+    they default to time.monotonic/time.sleep looked up when the limiter is created.
+    """
+
+    def __init__(self, rate, capacity=None, clock=None, sleep=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.rate))
+        self._clock = clock or time.monotonic
+        self._sleep = sleep or time.sleep
+        self._tokens = self.capacity
+        self._last = self._clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until `tokens` calls are allowed and consumes them
+        INPUT : tokens(int)
+        OUTPUT : None
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                # tolerance: float rounding can leave the bucket a hair short after a wait computed to refill it
+                if self._tokens >= tokens - 1e-9:
+                    self._tokens = max(0.0, self._tokens - tokens)
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            self._sleep(wait)
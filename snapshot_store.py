@@ -0,0 +1,124 @@
+import json
+import os
+import re
+
+import pandas as pd
+
+from storage import atomic_write
+
+# Columns needed to rank papers and compose the weekly thread
+RANKING_COLUMNS = ['pmid', 'title', 'score', 'cited_by_tweeters_count', 'cited_by_fbwalls_count',
+                   'cited_by_msm_count', 'cited_by_wikipedia_count', 'cited_by_feeds_count',
+                   'context.journal.pct', 'context.similar_age_3m.pct']
+
+INTEGER_COLUMNS = ['altmetric_id', 'readers_count', 'last_updated', 'added_on', 'published_on']
+FLOAT_COLUMNS = ['score']
+BOOLEAN_COLUMNS = ['is_oa']
+
+
+def column_dtype(column):
+    """
+    Explicit dtype of a json_normalize'd Altmetric column
+    INPUT : column(str)
+    OUTPUT : pandas dtype name (str) or None when the column is kept as a string
+    """
+    if column.startswith('cited_by_') or column.startswith('readers.') or column.startswith('cohorts.'):
+        return 'Int64'
+    if column.startswith('context.'):
+        return 'Float64' if column.endswith(('.mean', '.pct')) else 'Int64'
+    if column.startswith('history.') or column in FLOAT_COLUMNS:
+        return 'Float64'
+    if column in INTEGER_COLUMNS:
+        return 'Int64'
+    if column in BOOLEAN_COLUMNS:
+        return 'boolean'
+    return None
+
+
+def typed_frame(altmetric_df):
+    """
+    Casts a weekly altmetric_search frame to explicit dtypes: counts become nullable integers,
+    scores/percentiles nullable floats, list and dict values JSON strings and everything else strings
+    INPUT : altmetric_df - pd.df as returned by altmetric_search
+    OUTPUT : pd.df
+    """
+    typed = {}
+    for column in altmetric_df.columns:
+        values = altmetric_df[column]
+        dtype = column_dtype(column)
+        if dtype == 'boolean':
+            typed[column] = values.astype('boolean')
+        elif dtype is not None:
+            typed[column] = pd.to_numeric(values, errors='coerce').astype(dtype)
+        else:
+            typed[column] = values.map(lambda v: json.dumps(v) if isinstance(v, (list, dict)) else v,
+                                       na_action='ignore').astype('string')
+    return pd.DataFrame(typed, index=altmetric_df.index)
+
+
+def partition_name(analysis_date):
+    """
+    INPUT : analysis_date(str) - 'dd_mm_yyyy' as written by altmetric_search
+    OUTPUT : partition directory name, e.g. 'analysis_date=2022-09-19'
+    """
+    day, month, year = analysis_date.split('_')
+    return f'analysis_date={year}-{month}-{day}'
+
+
+def write_snapshot(altmetric_df, root):
+    """
+    Saves the full weekly Altmetric frame as a zstd-compressed Parquet file, partitioned by analysis_date
+    INPUT :
+        altmetric_df - pd.df as returned by altmetric_search
+        root(str) - directory holding all the snapshots
+    OUTPUT : path of the written file (str)
+    """
+    analysis_date = altmetric_df['analysis_date'].iloc[0]
+    partition = os.path.join(root, partition_name(analysis_date))
+    os.makedirs(partition, exist_ok=True)
+    output_file_name = os.path.join(partition, 'part-0.parquet')
+    with atomic_write(output_file_name, 'wb') as output_file:
+        typed_frame(altmetric_df.drop(columns='analysis_date')).to_parquet(
+            output_file, compression='zstd', index=False)
+    return output_file_name
+
+
+def iter_snapshots(root, columns=RANKING_COLUMNS, dates=None):
+    """
+    Lazily reads the weekly snapshots one partition at a time, loading only the requested columns
+    Columns missing from a week (e.g. no news coverage that week) come back empty
+    INPUT :
+        root(str) - directory holding all the snapshots
+        columns - list of columns to load
+        dates - optional list of 'yyyy-mm-dd' analysis dates to read
+    OUTPUT : generator of pd.df, one per analysis date, with an analysis_date column
+    """
+    import pyarrow.parquet as pq
+
+    if not os.path.isdir(root):
+        return
+    for partition in sorted(os.listdir(root)):
+        match = re.fullmatch(r'analysis_date=(\d{4}-\d{2}-\d{2})', partition)
+        if match is None or (dates is not None and match.group(1) not in dates):
+            continue
+        file_name = os.path.join(root, partition, 'part-0.parquet')
+        available = set(pq.read_schema(file_name).names)
+        snapshot_df = pd.read_parquet(file_name, columns=[c for c in columns if c in available])
+        for column in columns:
+            if column not in available:
+                snapshot_df[column] = pd.Series(pd.NA, index=snapshot_df.index,
+                                                dtype=column_dtype(column) or 'string')
+        snapshot_df = snapshot_df[list(columns)]
+        snapshot_df.insert(0, 'analysis_date', pd.Timestamp(match.group(1)))
+        yield snapshot_df
+
+
+def read_snapshots(root, columns=RANKING_COLUMNS, dates=None):
+    """
+    Same as iter_snapshots but returns every week in a single dataframe
+    OUTPUT : pd.df
+    """
+    frames = list(iter_snapshots(root, columns, dates))
+    if not frames:
+        return pd.DataFrame(columns=['analysis_date'] + list(columns))
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,88 @@
+import contextlib
+import fcntl
+import os
+import shutil
+import tempfile
+import time
+
+import metrics
+
+
+def fsync_directory(directory):
+    """
+    Makes a rename or a new file in directory durable
+    """
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    Exclusive lock shared by every process working on path (held on path + '.lock'),
+    so the always-on tasks and the scheduled tasks never write the same file at once
+    INPUT : path(str)
+    """
+    with open(path + '.lock', 'a') as lock_file:
+        with metrics.timed('file_lock_wait'):
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w', **kwargs):
+    """
+    Yields a temporary file next to path that replaces path (atomic rename) once the block
+    succeeds and the data is on disk. A crash leaves either the old or the new file, never half of it
+    INPUT : path(str), mode(str) - 'w' or 'wb', kwargs - passed to open()
+    """
+    start = time.perf_counter()
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **kwargs) as tmp_file:
+            yield tmp_file
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+        fsync_directory(directory)
+        metrics.observe('file_write_seconds', time.perf_counter() - start, kind='atomic')
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def append_lines(path, lines):
+    """
+    Appends lines to path with a single write and a single fsync (one call per sweep, not per line)
+    A crash mid-write can only leave the last line without its newline, which readers skip
+    until the next writer settles it (see PmidStore.refresh)
+    INPUT : path(str), lines - list of str without newline
+    OUTPUT : None
+    """
+    if not lines:
+        return
+    with metrics.timed('file_write', kind='append'), open(path, 'a') as appended_file:
+        appended_file.write(''.join(line + '\n' for line in lines))
+        appended_file.flush()
+        os.fsync(appended_file.fileno())
+
+
+def daily_snapshot(source, snapshot):
+    """
+    Copies source to snapshot atomically; running it again the same day rewrites the same
+    snapshot instead of appending to it, so it never holds duplicated lines
+    INPUT : source(str), snapshot(str) - e.g. 'pmid_db.txt' and '18_10_2026_pmid.txt'
+    OUTPUT : None
+    """
+    with file_lock(source), open(source, 'rb') as source_file, atomic_write(snapshot, 'wb') as snapshot_file:
+        shutil.copyfileobj(source_file, snapshot_file)
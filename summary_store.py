@@ -0,0 +1,89 @@
+import json
+import os
+import sqlite3
+import threading
+
+import metrics
+
+# ESummary fields kept for every article: enough to compose tweets and re-filter titles locally
+SUMMARY_FIELDS = ['Title', 'AuthorList', 'Source', 'FullJournalName', 'PubDate', 'PubTypeList']
+
+
+class SummaryStore:
+    """
+    Persistent (SQLite) store of PubMed ESummary records keyed by PMID.
+    pubmed.py saves every summary it retrieves, so the weekly Altmetric thread can be
+    composed without calling PubMed again. The connection is shared by the threads of a process.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS summaries (pmid TEXT PRIMARY KEY, payload TEXT NOT NULL)')
+        self._db.commit()
+
+    def put_many(self, records):
+        """
+        INPUT : records - list of ESummary records ('Bio.Entrez.Parser.DictionaryElement' or dict with an 'Id')
+        OUTPUT : None
+        """
+        rows = []
+        for record in records:
+            summary = {field: record[field] for field in SUMMARY_FIELDS if field in record}
+            rows.append((str(record['Id']), json.dumps(summary)))
+        with self._lock:
+            self._db.executemany('INSERT OR REPLACE INTO summaries VALUES (?, ?)', rows)
+            self._db.commit()
+
+    def get_many(self, pmids, fetch=None):
+        """
+        Batch lookup; with fetch (read-through mode) the missing PMIDs are retrieved
+        in one call to fetch, stored and returned with the others
+        INPUT :
+            pmids - list of PMIDs
+            fetch - optional callable(list of PMIDs) returning ESummary records (e.g. pubmed.fetch_summaries)
+        OUTPUT : dict {pmid(str): {'Title': ..., 'AuthorList': ..., 'Source': ..., ...}}
+        """
+        pmids = [str(pmid) for pmid in pmids]
+        summaries = {}
+        for start in range(0, len(pmids), 500):  # stays below SQLite's limit of bound parameters
+            chunk = pmids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            with self._lock:
+                rows = self._db.execute(
+                    f'SELECT pmid, payload FROM summaries WHERE pmid IN ({placeholders})', chunk).fetchall()
+            for pmid, payload in rows:
+                summaries[pmid] = json.loads(payload)
+        missing = [pmid for pmid in pmids if pmid not in summaries]
+        if fetch is not None and missing:
+            metrics.count('summary_store_misses_total', len(missing))
+            records = fetch(missing)
+            self.put_many(records)
+            summaries.update(self.get_many([record['Id'] for record in records]))
+        return summaries
+
+    def get(self, pmid, fetch=None):
+        """
+        INPUT : pmid(str), fetch - see get_many
+        OUTPUT : summary (dict) or None
+        """
+        return self.get_many([pmid], fetch).get(str(pmid))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM summaries').fetchone()[0]
+
+
+_stores = {}
+
+
+def open_summary_store(path):
+    """
+    Returns the SummaryStore for path, opening it the first time it is requested in this process
+    INPUT : path(str)
+    OUTPUT : SummaryStore
+    """
+    key = os.path.abspath(path)
+    if key not in _stores:
+        _stores[key] = SummaryStore(path)
+    return _stores[key]
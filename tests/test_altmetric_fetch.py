@@ -0,0 +1,96 @@
+import http.server
+import json
+import threading
+import urllib.parse
+
+import pytest
+
+from altmetric_fetch import AltmetricFetcher
+from ratelimit import RateLimiter
+
+
+class ScriptedHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Local stand-in for the Altmetric API: /v1/pmid/<pmid> answers the next (status, headers, body)
+    scripted for that PMID (the last one is repeated), 404 for PMIDs without a script
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        pmid = urllib.parse.urlsplit(self.path).path.rsplit('/', 1)[-1]
+        with self.server.lock:
+            self.server.calls.append(pmid)
+            answers = self.server.script.get(pmid, [(404, {}, 'Not Found')])
+            status, headers, body = answers.pop(0) if len(answers) > 1 else answers[0]
+        payload = body.encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def record(pmid):
+    return 200, {'Content-Type': 'application/json'}, json.dumps({'pmid': pmid, 'score': 12.5})
+
+
+RATE_LIMITED = (420, {}, 'Rate limited')
+
+
+@pytest.fixture
+def altmetric():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+    server.script, server.calls, server.lock = {}, [], threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def delays():
+    return []
+
+
+@pytest.fixture
+def fetcher(altmetric, delays):
+    return AltmetricFetcher(api_url=f'http://127.0.0.1:{altmetric.server_address[1]}/v1/', workers=2,
+                            limiter=RateLimiter(1000), sleep=delays.append)
+
+
+def test_rate_limited_then_ok_is_retried(altmetric, fetcher, delays):
+    altmetric.script['1'] = [RATE_LIMITED, record('1')]
+    assert fetcher.fetch('1') == ('ok', {'pmid': '1', 'score': 12.5})
+    assert altmetric.calls == ['1', '1']
+    assert delays == [2.0]  # backoff * 2 ** 0
+
+
+def test_retry_after_header_sets_the_delay(altmetric, fetcher, delays):
+    altmetric.script['1'] = [(420, {'Retry-After': '7'}, 'Rate limited'), record('1')]
+    assert fetcher.fetch('1')[0] == 'ok'
+    assert delays == [7.0]
+
+
+def test_gives_up_after_max_retries(altmetric, fetcher, delays):
+    altmetric.script['1'] = [RATE_LIMITED]
+    assert fetcher.fetch('1') == ('rate_limited', None)
+    assert len(altmetric.calls) == fetcher.max_retries + 1
+    assert delays == [2.0, 4.0, 8.0, 16.0]
+
+
+def test_not_found(altmetric, fetcher, delays):
+    assert fetcher.fetch('404') == ('not_found', None)
+    assert altmetric.calls == ['404']
+    assert delays == []
+
+
+def test_malformed_body_fails_only_that_pmid(altmetric, fetcher):
+    altmetric.script['1'] = [record('1')]
+    altmetric.script['2'] = [(200, {'Content-Type': 'application/json'}, '{"pmid": "2", "sco')]
+    altmetric.script['3'] = [RATE_LIMITED, record('3')]
+    results = list(fetcher.iter_fetch(['1', '2', '3', '4']))
+    assert [(pmid, outcome) for pmid, outcome, _ in results] == [
+        ('1', 'ok'), ('2', 'error'), ('3', 'ok'), ('4', 'not_found')]
@@ -0,0 +1,18 @@
+import os
+
+from hashtag_reteweet import RetweetPipeline, replay_stream
+from publisher import FakeBackend, Publisher, RateBudget
+
+STATUSES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'statuses.jsonl')
+
+
+def test_replay_counts_every_outcome():
+    # A one-slot queue and a slow backend: a replay must still hand every status to the workers
+    backend = FakeBackend(account_id=1, latency=0.01)
+    pipeline = RetweetPipeline(Publisher(backend, RateBudget(limit=float('inf'))), max_queue=1).start()
+    stats = replay_stream(STATUSES, pipeline)
+    assert {name: stats.get(name, 0) for name in ('received', 'dropped', 'retweeted', 'duplicate',
+                                                  'quote_ignored', 'retweet_ignored', 'own_ignored')} == {
+        'received': 9, 'dropped': 0, 'retweeted': 3, 'duplicate': 2, 'quote_ignored': 1,
+        'retweet_ignored': 2, 'own_ignored': 1}
+    assert sorted(call[1] for call in backend.calls if call[0] == 'retweet') == [11, 12, 16]
@@ -0,0 +1,124 @@
+import types
+
+import pytest
+import tweepy
+
+import pubmed
+from publish_queue import FAILED, POSTED, PublishQueue, run_publisher
+from publisher import FakeBackend, Publisher, RateBudget
+
+INTERVAL = 1200
+
+
+class FakeClock:
+    """
+    Clock and sleep for run_publisher: sleep() advances the clock instead of blocking
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / 'publish_queue.sqlite')
+
+
+def recording_post(clock, posts, failing=()):
+    def post(pmid, text):
+        if pmid in failing:
+            raise RuntimeError(f'{pmid} rejected')
+        posts.append((pmid, clock.now))
+        return len(posts)
+    return post
+
+
+def test_posts_at_the_interval(queue_path, clock):
+    publish_queue = PublishQueue(queue_path, clock=clock)
+    for pmid in ('1', '2', '3'):
+        assert publish_queue.enqueue(pmid, f'tweet {pmid}')
+    assert not publish_queue.enqueue('1', 'again')
+    posts = []
+    run_publisher(publish_queue, recording_post(clock, posts), INTERVAL, sleep=clock.sleep, clock=clock)
+    assert posts == [('1', 1000.0), ('2', 2200.0), ('3', 3400.0)]
+    assert publish_queue.counts() == {POSTED: 3}
+
+
+def test_restart_does_not_burst(queue_path, clock):
+    publish_queue = PublishQueue(queue_path, clock=clock)
+    for pmid in ('1', '2', '3'):
+        publish_queue.enqueue(pmid, f'tweet {pmid}')
+    publish_queue.mark_posted('1', 1)  # posted at 1000, then the process stops
+    publish_queue.close()
+
+    clock.now += 300  # and restarts 5 minutes later
+    restarted = PublishQueue(queue_path, clock=clock)
+    posts = []
+    run_publisher(restarted, recording_post(clock, posts), INTERVAL, sleep=clock.sleep, clock=clock)
+    assert posts == [('2', 2200.0), ('3', 3400.0)]
+
+
+def test_failing_article_is_given_up_without_blocking_the_queue(queue_path, clock):
+    publish_queue = PublishQueue(queue_path, max_attempts=3, clock=clock)
+    publish_queue.enqueue('1', 'tweet 1')
+    publish_queue.enqueue('2', 'tweet 2')
+    posts = []
+    run_publisher(publish_queue, recording_post(clock, posts, failing={'1'}), INTERVAL,
+                  sleep=clock.sleep, clock=clock)
+    assert posts == [('2', 2200.0)]  # posted right after the first failure, not after the third
+    assert publish_queue.counts() == {FAILED: 1, POSTED: 1}
+    attempts, = publish_queue._db.execute("SELECT attempts FROM queue WHERE pmid = '1'").fetchone()
+    assert attempts == 3
+
+
+class DuplicateBackend(FakeBackend):
+    def update_status(self, text, in_reply_to_status_id=None):
+        self._call('update_status', text, in_reply_to_status_id)
+        response = types.SimpleNamespace(status_code=403, reason='Forbidden')
+        raise tweepy.errors.Forbidden(response, response_json={
+            'errors': [{'code': 187, 'message': 'Status is a duplicate.'}]})
+
+
+def test_post_article_is_idempotent(tmp_path, monkeypatch):
+    pmid_db = str(tmp_path / 'pmid_db.txt')
+    backend = FakeBackend()
+    monkeypatch.setattr(pubmed, 'get_publisher', lambda: Publisher(backend, RateBudget(limit=float('inf'))))
+    assert pubmed.post_article('1', 'tweet 1', pmid_db) is not None
+    assert pubmed.post_article('1', 'tweet 1', pmid_db) is None  # already in pmid_db.txt: not tweeted again
+    assert [call[0] for call in backend.calls].count('update_status') == 1
+
+
+def test_duplicate_tweet_counts_as_posted(tmp_path, monkeypatch):
+    pmid_db = str(tmp_path / 'pmid_db.txt')
+    backend = DuplicateBackend()
+    monkeypatch.setattr(pubmed, 'get_publisher', lambda: Publisher(backend, RateBudget(limit=float('inf'))))
+    assert pubmed.post_article('1', 'tweet 1', pmid_db) is None
+    with open(pmid_db) as db:
+        assert db.read() == '1\n'
+
+
+def test_other_twitter_errors_are_raised(tmp_path, monkeypatch):
+    class RejectingBackend(FakeBackend):
+        def update_status(self, text, in_reply_to_status_id=None):
+            raise tweepy.errors.Forbidden(types.SimpleNamespace(status_code=403, reason='Forbidden'),
+                                          response_json={'errors': [{'code': 186, 'message': 'Too long'}]})
+
+    pmid_db = str(tmp_path / 'pmid_db.txt')
+    monkeypatch.setattr(pubmed, 'get_publisher',
+                        lambda: Publisher(RejectingBackend(), RateBudget(limit=float('inf'))))
+    with pytest.raises(tweepy.errors.Forbidden):
+        pubmed.post_article('1', 'tweet 1', pmid_db)
+    assert '1' not in pubmed.open_store(pmid_db)
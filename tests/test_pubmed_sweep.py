@@ -0,0 +1,69 @@
+import datetime
+import json
+
+import pytest
+
+import config
+import pubmed
+from publish_queue import PublishQueue
+
+TODAY = datetime.date.today()
+
+
+class FakeEntrez:
+    """
+    esearch over {Entrez date: [PMIDs]} that, like ESearch, refuses to page past ESEARCH_MAX_RECORDS,
+    and esummary records for any PMID
+    """
+
+    def __init__(self, pmids_by_day):
+        self.pmids_by_day = pmids_by_day
+        self.summarised = []
+
+    def __call__(self, endpoint, **params):
+        if endpoint == 'esummary':
+            pmids = params['id'].split(',')
+            self.summarised.extend(pmids)
+            return [{'Id': pmid, 'Title': f'Title {pmid}', 'AuthorList': ['Doe J'], 'PubDate': '2026'}
+                    for pmid in pmids]
+        assert params['retstart'] + params['retmax'] <= pubmed.ESEARCH_MAX_RECORDS
+        mindate, maxdate = (datetime.datetime.strptime(params[key], '%Y/%m/%d').date()
+                            for key in ('mindate', 'maxdate'))
+        pmids = [pmid for day, day_pmids in sorted(self.pmids_by_day.items()) if mindate <= day <= maxdate
+                 for pmid in day_pmids]
+        return {'Count': str(len(pmids)),
+                'IdList': pmids[params['retstart']:params['retstart'] + params['retmax']]}
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'pubmed_summaries_path', str(tmp_path / 'pubmed_summaries.sqlite'))
+    return tmp_path
+
+
+def test_large_window_is_split_by_date(monkeypatch):
+    pmids_by_day = {TODAY - datetime.timedelta(days=day): [f'{day}{i:05}' for i in range(3000)]
+                    for day in range(1, 8)}
+    monkeypatch.setattr(pubmed, 'entrez_call', FakeEntrez(pmids_by_day))
+    pmids = pubmed.esearch_window('query', TODAY - datetime.timedelta(days=7), TODAY)
+    assert sorted(pmids) == sorted(pmid for day_pmids in pmids_by_day.values() for pmid in day_pmids)
+
+
+def test_known_pmids_are_not_summarised(workdir, monkeypatch):
+    entrez = FakeEntrez({TODAY: ['1', '2', '3', '4']})
+    monkeypatch.setattr(pubmed, 'entrez_call', entrez)
+    pmid_db = str(workdir / 'pmid_db.txt')
+    with open(pmid_db, 'w') as db:
+        db.write('1\n')  # already posted
+    publish_queue = PublishQueue(str(workdir / 'publish_queue.sqlite'))
+    publish_queue.enqueue('2', 'tweet 2')  # queued by the previous sweep of the same day
+    state_file = str(workdir / 'pubmed_state.json')
+
+    assert pubmed.discover_articles('query', 300, pmid_db, publish_queue, state_file=state_file) == 2
+    assert entrez.summarised == ['3', '4']
+    with open(state_file) as state:
+        assert json.load(state) == {'last_edat': TODAY.strftime('%Y/%m/%d')}
+
+    entrez.summarised.clear()
+    assert pubmed.discover_articles('query', 300, pmid_db, publish_queue, state_file=state_file) == 0
+    assert entrez.summarised == []
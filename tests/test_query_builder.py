@@ -0,0 +1,56 @@
+import pytest
+
+from pubmed import GERIATRIC_QUERY
+from query_builder import BooleanNode, QueryError, Term, compile_matcher, parse, to_entrez, validate
+
+
+def test_missing_operator_is_reported():
+    query = 'fish[ti] OR zebrafish[ti] rodent[ti] OR rats[ti]'
+    assert validate(query) == ['Missing operator before rodent[ti]']
+    with pytest.raises(QueryError, match='Missing operator'):
+        parse(query)
+    tree = parse(query, strict=False)  # read as an implicit AND, like PubMed does
+    assert tree.operator == 'OR' and tree.children[0].operator == 'AND'
+
+
+@pytest.mark.parametrize('query, problem', [
+    ('(elderly[ti] OR aging[ti]', 'Missing closing parenthesis'),
+    ('elderly[ti] OR aging[ti])', 'Unbalanced closing parenthesis'),
+    ('elderly[ti] OR', 'Query ends where a term was expected'),
+])
+def test_invalid_queries(query, problem):
+    assert validate(query) == [problem]
+
+
+def test_geriatric_query_round_trip():
+    assert validate(GERIATRIC_QUERY) == []
+    tree = parse(GERIATRIC_QUERY)
+    assert to_entrez(tree) == GERIATRIC_QUERY
+    assert to_entrez(parse(to_entrez(tree))) == GERIATRIC_QUERY
+
+
+def test_untagged_words_join_the_next_tagged_word():
+    tree = parse('old age[ti] OR "meta analysis" OR systematic search[All fields]')
+    assert isinstance(tree, BooleanNode)
+    assert [(term.text, term.field, term.quoted) for term in tree.children] == [
+        ('old age', 'ti', False), ('meta analysis', None, True), ('systematic search', 'All fields', False)]
+    assert isinstance(parse('octogenarian*[ti]'), Term)
+
+
+def test_operators_apply_left_to_right():
+    # (dementia NOT mice) OR delirium, not dementia NOT (mice OR delirium)
+    matcher = compile_matcher('dementia[ti] NOT mice[ti] OR delirium[ti]')
+    assert matcher('Dementia in older adults')
+    assert not matcher('Dementia in mice')
+    assert matcher('Delirium in mice')
+    assert matcher('Dementia and delirium in mice')
+
+
+def test_geriatric_matcher():
+    matcher = compile_matcher(GERIATRIC_QUERY)
+    assert matcher('Frailty in octogenarians after hip fracture')
+    assert not matcher('Dementia-like behaviour in mice')
+    assert matcher('Dementia models in mice: a systematic review')
+    assert not matcher('Sleep in older adults', pub_types=['Editorial'])
+    assert matcher("Gait in Parkinson’s disease")
+    assert not matcher('Outcomes of pediatric surgery')
@@ -0,0 +1,105 @@
+import asyncio
+import datetime
+
+import pytest
+
+from geripapers_service import Every, ServiceState, Weekly, last_weekly_thread, run_scheduled
+
+SUNDAY = datetime.datetime(2026, 10, 18)
+
+
+def test_every():
+    schedule = Every(3600)
+    assert schedule.next_run(None, SUNDAY) == SUNDAY
+    assert schedule.next_run(SUNDAY, SUNDAY) == SUNDAY + datetime.timedelta(hours=1)
+
+
+@pytest.mark.parametrize('last_run, now, expected', [
+    (None, datetime.datetime(2026, 10, 14, 10), datetime.datetime(2026, 10, 18, 12)),
+    (None, SUNDAY.replace(hour=15), SUNDAY.replace(hour=12)),  # no history: posted now
+    (SUNDAY.replace(hour=12), SUNDAY.replace(hour=15), datetime.datetime(2026, 10, 25, 12)),
+    (datetime.datetime.combine(SUNDAY, datetime.time.max), SUNDAY.replace(hour=15),
+     datetime.datetime(2026, 10, 25, 12)),
+    (datetime.datetime(2026, 10, 11, 12), datetime.datetime(2026, 10, 19, 9), SUNDAY.replace(hour=12)),  # missed
+    (datetime.datetime(2026, 10, 14, 23, 59), datetime.datetime(2026, 10, 15, 9), SUNDAY.replace(hour=12)),
+])
+def test_weekly(last_run, now, expected):
+    assert Weekly(6, 12).next_run(last_run, now) == expected
+
+
+@pytest.fixture
+def state(tmp_path):
+    return ServiceState(str(tmp_path / 'service_state.json'))
+
+
+def run(name, schedule, job, state, **kwargs):
+    """
+    Runs run_scheduled until the job sets stop, or for at most half a second
+    """
+    async def scheduled():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.5, stop.set)
+        await run_scheduled(name, schedule, lambda: job(lambda: loop.call_soon_threadsafe(stop.set)), state, stop,
+                            **kwargs)
+
+    asyncio.run(scheduled())
+
+
+def test_failed_job_is_retried_and_recorded_once_done(state):
+    calls = []
+
+    def job(stop):
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError('PubMed is down')
+        stop()
+
+    run('pubmed_sweep', Every(3600), job, state, retry_delay=0)
+    assert len(calls) == 2
+    assert state.last_run('pubmed_sweep') is not None
+    assert ServiceState(state.path).last_run('pubmed_sweep') == state.last_run('pubmed_sweep')
+
+
+def test_job_failing_before_it_took_effect_is_retried(state):
+    calls, done = [], []
+
+    def job(stop):
+        calls.append(None)
+        if len(calls) < 3:
+            raise RuntimeError('Altmetric is down')  # before the paper of the week is written
+        done.append(datetime.datetime.now())
+        stop()
+
+    run('weekly_thread', Every(3600), job, state, retry_delay=0, last_done=lambda: max(done, default=None))
+    assert len(calls) == 3
+
+
+def test_job_failing_after_it_took_effect_is_not_repeated(state):
+    calls, done = [], []
+
+    def job(stop):
+        calls.append(None)
+        done.append(datetime.datetime.now())  # paper of the week written...
+        raise RuntimeError('Twitter is down')  # ...but the thread failed
+
+    run('weekly_thread', Every(3600), job, state, retry_delay=0, last_done=lambda: max(done, default=None))
+    assert len(calls) == 1
+    assert state.last_run('weekly_thread') is None
+
+
+def test_job_already_done_is_not_run(state):
+    calls = []
+    run('weekly_thread', Every(3600), lambda stop: calls.append(None), state,
+        last_done=lambda: datetime.datetime.now())
+    assert calls == []
+
+
+def test_last_weekly_thread_is_read_from_the_selected_papers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert last_weekly_thread() is None
+    (tmp_path / 'highest_altmetric_papers.csv').write_text(
+        'analysis_date,pmid,score\n04_10_2026,100,5\n18_10_2026,200,7\n11_10_2026,300,6\n')
+    assert last_weekly_thread() == datetime.datetime.combine(SUNDAY, datetime.time.max)
+    # A service started that Sunday afternoon waits for the next week
+    assert Weekly(6, 12).next_run(last_weekly_thread(), SUNDAY.replace(hour=15)) == datetime.datetime(2026, 10, 25, 12)
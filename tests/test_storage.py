@@ -0,0 +1,214 @@
+"""
+Fault injection for pmid_db.txt and the files rewritten with atomic_write: a writer is SIGKILLed in the
+middle of a write, and the file must then hold every acknowledged PMID (add_many returned) exactly once.
+"""
+import builtins
+import errno
+import os
+import random
+import signal
+import time
+import traceback
+
+import pytest
+
+import pmid_store
+import storage
+from pmid_store import PmidStore
+from storage import atomic_write
+
+
+def kill_self(*args, **kwargs):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def run_child(target, kill_after=None):
+    """
+    Runs target(ack) in a forked child; ack(pmids) reports PMIDs whose add_many returned
+    INPUT : target - callable, kill_after(float) - seconds before the parent SIGKILLs the child
+    OUTPUT : (list of acknowledged PMIDs, signal that ended the child or None)
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            target(lambda pmids: os.write(write_fd, ''.join(pmid + '\n' for pmid in pmids).encode()))
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+        os._exit(0)
+    os.close(write_fd)
+    if kill_after is not None:
+        time.sleep(kill_after)
+        os.kill(pid, signal.SIGKILL)
+    chunks = []
+    with os.fdopen(read_fd, 'rb') as acks:
+        for chunk in iter(lambda: acks.read(65536), b''):
+            chunks.append(chunk)
+    _, status = os.waitpid(pid, 0)
+    killed_by = os.WTERMSIG(status) if os.WIFSIGNALED(status) else None
+    return b''.join(chunks).decode().split(), killed_by
+
+
+def file_lines(path):
+    with open(path) as db:
+        return db.read().splitlines()
+
+
+def assert_consistent(path, acknowledged):
+    store = PmidStore(path)
+    lines = file_lines(path)
+    assert len(lines) == len(set(lines)), 'duplicated PMIDs in the file'
+    assert all(pmid in store for pmid in acknowledged), 'acknowledged PMIDs lost'
+    return store
+
+
+class TornFile:
+    """
+    File whose write() puts the first half of the data on disk and then kills the process
+    """
+
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wrapped.close()
+
+    def write(self, text):
+        self.wrapped.write(text[:len(text) // 2])
+        self.wrapped.flush()
+        kill_self()
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / 'pmid_db.txt'
+    path.write_text('100\n200\n')
+    return str(path)
+
+
+def test_kill_before_fsync(db):
+    def writer(ack):
+        store = PmidStore(db)
+        ack(store.add_many(['301', '302']))
+        storage.os.fsync = kill_self
+        ack(store.add_many(['401', '402']))
+
+    acknowledged, killed_by = run_child(writer)
+
+    assert killed_by == signal.SIGKILL
+    assert acknowledged == ['301', '302']
+    store = assert_consistent(db, ['100', '200'] + acknowledged)
+    store.add_many(['401', '402', '301'])
+    assert_consistent(db, ['100', '200', '301', '302', '401', '402'])
+
+
+def test_kill_mid_write_leaves_torn_line(db):
+    def writer(ack):
+        store = PmidStore(db)
+        ack(store.add_many(['301', '302']))
+        storage.open = lambda path, mode: TornFile(builtins.open(path, mode)) if path == db else \
+            builtins.open(path, mode)
+        ack(store.add_many(['40001', '40002', '40003']))
+
+    acknowledged, killed_by = run_child(writer)
+
+    assert killed_by == signal.SIGKILL
+    assert acknowledged == ['301', '302']
+    with open(db, 'rb') as torn:
+        assert not torn.read().endswith(b'\n')
+    store = assert_consistent(db, ['100', '200'] + acknowledged)
+    assert '40003' not in store
+    store.add_many(['40001', '40002', '40003'])
+    assert_consistent(db, ['100', '200', '301', '302', '40001', '40002', '40003'])
+
+
+def test_garbage_last_line_is_cut(db):
+    with open(db, 'ab') as torn:
+        torn.write(b'123\x00\x00')  # zero-filled tail left by a power loss
+    store = PmidStore(db)
+    assert len(store) == 2
+    store.add('300')
+    assert file_lines(db) == ['100', '200', '300']
+
+
+def test_unterminated_pmid_is_kept(db):
+    with open(db, 'a') as edited:
+        edited.write('300')
+    store = PmidStore(db)
+    store.add_many(['300', '400'])
+    assert file_lines(db) == ['100', '200', '300', '400']
+
+
+def test_failed_fsync_does_not_index(db, monkeypatch):
+    def disk_full(fd):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+    store = PmidStore(db)
+    monkeypatch.setattr(storage.os, 'fsync', disk_full)
+    with pytest.raises(OSError):
+        store.add('300')
+    assert '300' not in store
+    monkeypatch.undo()
+    store.add('300')  # the write went through before the fsync failed: indexed again, not duplicated
+    assert '300' in store
+    assert file_lines(db) == ['100', '200', '300']
+
+
+def test_random_kills(db):
+    pmids = [str(pmid) for pmid in range(10000, 12000)]
+    acknowledged = ['100', '200']
+    rng = random.Random(14)
+    for _ in range(10):
+        def writer(ack):
+            store = PmidStore(db)
+            for start in range(0, len(pmids), 20):
+                batch = pmids[start:start + 20]
+                store.add_many(batch)
+                ack(batch)
+
+        acked, _ = run_child(writer, kill_after=rng.uniform(0.001, 0.05))
+        acknowledged += acked
+        assert_consistent(db, acknowledged)
+    PmidStore(db).add_many(pmids)
+    assert_consistent(db, acknowledged + pmids)
+
+
+@pytest.mark.parametrize('crash_point', ['write', 'replace'])
+def test_atomic_write_killed(tmp_path, crash_point):
+    path = tmp_path / 'highest_altmetric_papers.csv'
+    path.write_text('pmid,score\n100,5\n')
+
+    def writer(ack):
+        if crash_point == 'replace':
+            storage.os.replace = kill_self
+        with atomic_write(str(path)) as rewritten:
+            rewritten.write('pmid,score\n100,5\n')
+            if crash_point == 'write':
+                rewritten.flush()
+                kill_self()
+            rewritten.write('200,7\n')
+
+    _, killed_by = run_child(writer)
+
+    assert killed_by == signal.SIGKILL
+    assert path.read_text() == 'pmid,score\n100,5\n'
+
+
+def test_readers_do_not_open_for_writing(db, monkeypatch):
+    modes = []
+
+    def recording_open(path, mode='r', *args, **kwargs):
+        modes.append(mode)
+        return builtins.open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr(pmid_store, 'open', recording_open, raising=False)
+    store = PmidStore(db)
+    with open(db, 'a') as appended:
+        appended.write('300\n')
+    assert store.filter_new(['300', '400']) == ['400']  # picks up the append of another process
+    assert modes and all(mode == 'rb' for mode in modes)